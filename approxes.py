@@ -1,67 +1,99 @@
+from __future__ import annotations
+import heapq
 import random
-import networkx as nx
+from typing import TYPE_CHECKING
+import numpy as np
+from graph_io import to_csr
+if TYPE_CHECKING:
+    import networkx as nx
+
+# all three read the (possibly memory-mapped) CSR arrays and keep flags instead of mutating a
+# copy of the graph: besides the CSR they hold a few arrays of n entries and, in approx_2_ds,
+# one int32 per adjacency entry
 
 def approx_2_ds(g_orig: nx.Graph):
-    g = g_orig.copy()
-    n = len(g.nodes)
-    answer = 0
+    # takes both ends of a random remaining edge and deletes their closed neighbourhoods. the
+    # adjacency entries are visited in a random order; an edge is still there iff neither end
+    # has been deleted, so this is the same as drawing uniformly from the remaining edges
+    g = to_csr(g_orig)
+    n, indptr, indices = g.n, g.indptr, g.indices
     ds = set()
-    dominated = set()
-    while len(g.edges) > 0:
-        edge = random.choice(list(g.edges))
-        ds.add(edge[0])
-        ds.add(edge[1])
-        answer += 2
-        if edge[0] == edge[1]:
-            answer -= 1
-        d = set(g.neighbors(edge[0]))
-        d = d.union(g.neighbors(edge[1]))
-        d.discard(edge[0])
-        d.discard(edge[1])
-        dominated.update(d)
-        dominated.update(set(edge))
-        g.remove_nodes_from(d)
-        g.remove_nodes_from(edge)
-    for i in range(1, n):
-        if i not in dominated:
-            ds.add(i)
-            answer += 1
+    deleted = np.zeros(n + 1, dtype=bool)
+    order = np.arange(len(indices), dtype=np.int32 if len(indices) < 1 << 31 else np.int64)
+    np.random.default_rng(random.getrandbits(64)).shuffle(order)
+    for i in range(0, len(order), 1 << 16):
+        entries = order[i:i + (1 << 16)]
+        src = np.searchsorted(indptr, entries, 'right') - 1
+        dst = indices[entries]
+        alive = ~(deleted[src] | deleted[dst])
+        for a, b in zip(src[alive].tolist(), dst[alive].tolist()):
+            if deleted[a] or deleted[b]:
+                continue
+            ds.add(a)
+            ds.add(b)
+            deleted[indices[indptr[a]:indptr[a + 1]]] = True
+            deleted[indices[indptr[b]:indptr[b + 1]]] = True
+            deleted[a] = deleted[b] = True
+    ds.update((np.flatnonzero(~deleted[1:]) + 1).tolist())
     return ds
 
 
 def approx_ln_ds(g_orig: nx.Graph):
-    g = g_orig.copy()
+    # repeatedly takes an undominated vertex with the most undominated neighbours;
+    # gains only decrease, so stale heap entries are re-pushed lazily when popped
+    g = to_csr(g_orig)
+    n, indices = g.n, g.indices
+    bounds = g.indptr.tolist()
     ds = set()
-    dominated = set()
-    answer = 0
-    n = len(g.nodes)
-    while len(g.edges) > 0:
-        v = max(g.degree, key=lambda x: x[1])
-        ds.add(v[0])
-        d = set(g.neighbors(v[0]))
-        d.discard(v[0])
-        dominated.update(d)
-        dominated.add(v[0])
-        g.remove_nodes_from(d)
-        g.remove_node(v[0])
-        answer += 1
-    for i in range(1, n + 1):
-        if i not in dominated:
-            ds.add(i)
-            answer += 1
+    dominated = bytearray(n + 1)
+    gain = [bounds[v + 1] - bounds[v] for v in range(n + 1)]
+    heap = [(-gain[v], v) for v in range(1, n + 1) if gain[v] > 0]
+    heapq.heapify(heap)
+    while heap:
+        neg_gain, v = heapq.heappop(heap)
+        if dominated[v]:
+            continue
+        if -neg_gain != gain[v]:
+            if gain[v] > 0:
+                heapq.heappush(heap, (-gain[v], v))
+            continue
+        ds.add(v)
+        newly = [u for u in indices[bounds[v]:bounds[v + 1]].tolist() if not dominated[u]]
+        newly.append(v)
+        for u in newly:
+            dominated[u] = 1
+        for u in newly:
+            for w in indices[bounds[u]:bounds[u + 1]].tolist():
+                gain[w] -= 1
+    ds.update((np.flatnonzero(np.frombuffer(dominated, dtype=np.uint8)[1:] == 0) + 1).tolist())
     return ds
 
 def approx_greedy_ds(g_orig: nx.Graph):
-    g = g_orig
+    # classic greedy: take the vertex whose closed neighbourhood dominates the most new vertices
+    g = to_csr(g_orig)
+    n, indices = g.n, g.indices
+    bounds = g.indptr.tolist()
     ds = set()
-    dominated = set()
-    n = len(g.nodes)
-    all_vers = set(range(1, n + 1))
-    while len(dominated) != n:
-        v = max(all_vers.difference(ds), key=lambda x: len(set(g.neighbors(x)).difference(ds).difference({x})))
+    dominated = bytearray(n + 1)
+    gain = [bounds[v + 1] - bounds[v] + 1 for v in range(n + 1)]
+    heap = [(-gain[v], v) for v in range(1, n + 1)]
+    heapq.heapify(heap)
+    left = n
+    while left > 0:
+        neg_gain, v = heapq.heappop(heap)
+        if v in ds:
+            continue
+        if -neg_gain != gain[v]:
+            heapq.heappush(heap, (-gain[v], v))
+            continue
         ds.add(v)
-        d = set(g.neighbors(v))
-        d.discard(v)
-        dominated.update(d)
-        dominated.add(v)
+        newly = [u for u in indices[bounds[v]:bounds[v + 1]].tolist() if not dominated[u]]
+        if not dominated[v]:
+            newly.append(v)
+        for u in newly:
+            dominated[u] = 1
+            gain[u] -= 1
+            for w in indices[bounds[u]:bounds[u + 1]].tolist():
+                gain[w] -= 1
+        left -= len(newly)
     return ds
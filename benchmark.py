@@ -0,0 +1,116 @@
+import os
+import argparse
+import json
+import random
+import resource
+from concurrent.futures import ProcessPoolExecutor
+from time import time
+from solvers import solve, ds_solvers
+from graph_io import read_gr, adjacency_lists, CACHE_DIR
+from domination import CoverState
+from get_bounds import time_limit, TimeoutException
+
+
+# any DS solver of the registry can be benchmarked; the anneal_<schedule> ones run untimed
+DEFAULT = ['approx_2', 'approx_ln', 'approx_greedy', 'lp_rounding', 'lp_rounding_v2', 'anneal_exp', 'anneal_poly']
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # ru_maxrss is in KiB on linux
+
+
+def run_benchmark(filepath, name, seed, timeout):
+    # runs in a fresh worker process, so the peak RSS belongs to this job alone
+    random.seed(seed)
+    g = read_gr(filepath, CACHE_DIR)
+    row = {'graph': os.path.basename(filepath), 'vertices': g.number_of_nodes(), 'algorithm': name, 'seed': seed}
+    start = time()
+    try:
+        with time_limit(timeout):
+            ds = solve(name, g, start + timeout - 1 - time())
+    except TimeoutException:
+        ds = None
+    row['time'] = round(time() - start, 3)
+    row['peak_rss_mb'] = round(peak_rss_mb(), 1)
+    # a timeout has no DS to check, so it is neither valid nor invalid
+    row['timeout'] = ds is None
+    if ds is None:
+        row['size'], row['valid'] = None, None
+    else:
+        row['size'] = len(ds)
+        row['valid'] = CoverState(adjacency_lists(g), ds).is_dominating()
+    return row
+
+
+def lower_bound(filepath, timeout):
+    # the LP bound under the same budget as a job; None if HiGHS does not finish in time
+    try:
+        return solve('lp_bound', read_gr(filepath, CACHE_DIR), timeout)
+    except Exception:
+        return None
+
+
+def run_suite(graph_dirs, names, seeds, timeout, workers=None):
+    files = sorted(os.path.join(d, f) for d in graph_dirs for f in os.listdir(d) if f.endswith('.gr'))
+    jobs = [(filepath, name, seed) for filepath in files for name in names for seed in seeds]
+    print(f"{len(jobs)} benchmark jobs on {len(files)} graphs")
+    # one job per worker process: peak RSS is per process and cannot be reset
+    with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1) as pool:
+        bounds = pool.map(lower_bound, files, [timeout] * len(files))
+        rows = pool.map(run_benchmark, *zip(*jobs), [timeout] * len(jobs))
+        bounds, rows = dict(zip(files, bounds)), list(rows)
+    for row, (filepath, _, _) in zip(rows, jobs):
+        bound = row['lower_bound'] = bounds[filepath]
+        row['gap'] = None if row['size'] is None or bound is None else round(row['size'] / max(bound, 1) - 1, 4)
+    return rows
+
+
+def compare(rows, baseline, size_tol=0.0, time_tol=0.25, time_slack=0.05):
+    # regressions of rows against a baseline run: a larger or invalid DS, a timeout, or a run slower
+    # than time_tol (relative) plus time_slack seconds (absolute, so tiny timings do not flap)
+    base = {(b['graph'], b['algorithm'], b['seed']): b for b in baseline}
+    regressions = []
+    for row in rows:
+        b = base.get((row['graph'], row['algorithm'], row['seed']))
+        if b is None:
+            continue
+        if not b.get('timeout') and row['timeout']:
+            regressions.append((row, 'timeout', b['time'], row['time']))
+        elif b['valid'] and row['valid'] is False:
+            regressions.append((row, 'invalid', b['size'], row['size']))
+        elif b['size'] is not None and row['size'] is not None and row['size'] > b['size'] * (1 + size_tol):
+            regressions.append((row, 'quality', b['size'], row['size']))
+        if row['time'] > b['time'] * (1 + time_tol) + time_slack:
+            regressions.append((row, 'speed', b['time'], row['time']))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the heuristics and compare against a baseline")
+    parser.add_argument('--dirs', nargs='+', default=['./exact_graphs'])
+    parser.add_argument('--algos', nargs='+', default=DEFAULT, choices=ds_solvers())
+    parser.add_argument('--seeds', nargs='+', type=int, default=[0])
+    parser.add_argument('--timeout', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default='benchmark.json')
+    parser.add_argument('--baseline', default=None, help="earlier --out file to compare against")
+    parser.add_argument('--size-tol', type=float, default=0.0)
+    parser.add_argument('--time-tol', type=float, default=0.25)
+    args = parser.parse_args()
+
+    rows = run_suite(args.dirs, args.algos, args.seeds, args.timeout, args.workers)
+    for row in rows:
+        print(f"{row['graph']:>16} {row['algorithm']:>16} size {row['size']} gap {row['gap']} "
+              f"time {row['time']} rss {row['peak_rss_mb']}MB"
+              f"{' TIMEOUT' if row['timeout'] else '' if row['valid'] else ' INVALID'}")
+    with open(args.out, 'w') as f:
+        json.dump(rows, f, indent=1)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            regressions = compare(rows, json.load(f), args.size_tol, args.time_tol)
+        for row, kind, before, after in regressions:
+            print(f"REGRESSION {kind}: {row['graph']} {row['algorithm']} seed {row['seed']}: {before} -> {after}")
+        print(f"{len(regressions)} regressions against {args.baseline}")
+        if regressions:
+            raise SystemExit(1)
@@ -0,0 +1,111 @@
+import heapq
+import itertools
+from math import ceil
+from time import time
+import numpy as np
+import networkx as nx
+from lower_bound_lp import PersistentLP
+from local_search import DSAnnealing
+from graph_io import load_graph, CACHE_DIR
+
+
+class DSBranchAndBound:
+    # best-first branch and bound over x_v in {0, 1}: every node is bounded by ceil(LP) under its
+    # fixings and pruned as soon as that reaches the incumbent; after branching we keep diving into
+    # one child and only go back to the queue when the dive is pruned
+    def __init__(self, g: nx.Graph, incumbent=None, approx_type='ln', resolve='simplex', anneal_time=None):
+        # anneal_time: seconds for the annealing run that seeds the incumbent when none is given
+        self.g = g
+        self.n = g.number_of_nodes()
+        self.lp = PersistentLP(g, resolve)
+        if incumbent is None:
+            g_anneal = DSAnnealing(g, approx_type)
+            g_anneal.annealing(time_limit=anneal_time)
+            incumbent = g_anneal.ds
+        self.best_ds = set(incumbent)
+        self.best = len(self.best_ds)
+        self.lower_bound = 0
+        self.nodes = 0
+        self.optimal = False
+        self.elapsed = 0.0
+
+    def bound(self, ones, zeros):
+        values = self.lp.solve(ones, zeros)
+        if values is None:
+            return None, None
+        return ceil(values.sum() - 1e-6), values
+
+    def solve(self, time_limit=None, node_limit=None):
+        start = time()
+        counter = itertools.count()
+        # queue entries: (parent bound, -depth, tie, ones, zeros)
+        queue = [(0, 0, next(counter), (), ())]
+        dive = None
+        root = True
+        while dive is not None or queue:
+            if (time_limit is not None and time() - start > time_limit) or \
+                    (node_limit is not None and self.nodes >= node_limit):
+                break
+            if dive is not None:
+                _, ones, zeros = dive
+                dive = None
+            else:
+                parent_bound, _, _, ones, zeros = heapq.heappop(queue)
+                if parent_bound >= self.best:
+                    continue
+            self.nodes += 1
+            lb, values = self.bound(ones, zeros)
+            if root:
+                self.lower_bound = lb if lb is not None else self.best
+                root = False
+            if lb is None or lb >= self.best:
+                continue
+            fractional = np.flatnonzero((values > 0) & (values < 1))
+            if len(fractional) == 0:
+                self.best_ds = set(np.flatnonzero(values == 1).tolist())
+                self.best = len(self.best_ds)
+                continue
+            v = int(fractional[np.argmin(np.abs(0.5 - values[fractional]))])
+            take = (ones + (v,), zeros)
+            drop = (ones, zeros + (v,))
+            first, second = (take, drop) if values[v] >= 0.5 else (drop, take)
+            dive = (lb, *first)
+            heapq.heappush(queue, (lb, -len(ones) - len(zeros) - 1, next(counter), *second))
+
+        self.elapsed = time() - start
+        open_bounds = [entry[0] for entry in queue if entry[0] < self.best]
+        if dive is not None:
+            open_bounds.append(dive[0])
+        if open_bounds:
+            self.lower_bound = max(self.lower_bound, min(open_bounds))
+            self.optimal = False
+        else:
+            self.lower_bound = self.best
+            self.optimal = True
+        return self.best
+
+    def gap(self):
+        if self.best == 0:
+            return 0.0
+        return (self.best - self.lower_bound) / self.best
+
+    def report(self):
+        return {'best': self.best, 'lower_bound': self.lower_bound, 'gap': self.gap(),
+                'optimal': self.optimal, 'nodes': self.nodes, 'time': self.elapsed}
+
+
+def branch_and_bound(g, time_limit=None, node_limit=None, seed_share=0.25):
+    # the whole run within time_limit: seed_share of it seeds the incumbent, the rest is search
+    start = time()
+    bnb = DSBranchAndBound(g, anneal_time=None if time_limit is None else time_limit * seed_share)
+    bnb.solve(None if time_limit is None else max(0.0, time_limit - (time() - start)), node_limit)
+    return bnb
+
+
+if __name__ == "__main__":
+    g = load_graph(f"./exact_graphs/exact_001.gr", CACHE_DIR)
+
+    bnb = DSBranchAndBound(g)
+    print(f"Incumbent from annealing: {bnb.best}")
+    bnb.solve(time_limit=300)
+    print(bnb.report())
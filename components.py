@@ -0,0 +1,151 @@
+import random
+from concurrent.futures import ProcessPoolExecutor
+from time import time
+import numpy as np
+import networkx as nx
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from graph_io import load_graph, to_csr, CACHE_DIR
+from tree_dp import exact_ds
+
+
+class Component:
+    # a connected piece of the input: vertices[i - 1] is the original id of local vertex i, and
+    # g (vertices 1..k, like a loaded graph) is only built for components that need a solver
+    def __init__(self, vertices, src, dst):
+        self.vertices = vertices
+        self.src = src
+        self.dst = dst
+        self.g = None
+
+    def __len__(self):
+        return len(self.vertices)
+
+    def number_of_edges(self):
+        return len(self.src)
+
+    def graph(self):
+        if self.g is None:
+            self.g = nx.Graph()
+            self.g.add_nodes_from(range(1, len(self) + 1))
+            self.g.add_edges_from(zip(self.src.tolist(), self.dst.tolist()))
+        return self.g
+
+    def lift(self, ds):
+        return {int(self.vertices[v - 1]) for v in ds}
+
+
+def split_components(g):
+    # connected components, largest first, with their edges relabelled to 1..k
+    csr = to_csr(g)
+    n = csr.number_of_nodes()
+    matrix = csr_matrix((np.ones(len(csr.indices), dtype=np.int8), csr.indices, csr.indptr), shape=(n + 1, n + 1))
+    _, labels = connected_components(matrix, directed=False)
+    labels = labels[1:]  # drop the dummy vertex 0, whatever label it got
+    _, labels = np.unique(labels, return_inverse=True)
+
+    order = np.argsort(labels, kind='stable')
+    sizes = np.bincount(labels)
+    starts = np.concatenate(([0], np.cumsum(sizes)))
+    local = np.zeros(n + 1, dtype=np.int64)
+    local[order + 1] = np.arange(n) - starts[labels[order]] + 1
+
+    src, dst = csr.edges()
+    edge_labels = labels[src - 1]
+    edge_order = np.argsort(edge_labels, kind='stable')
+    edge_starts = np.concatenate(([0], np.cumsum(np.bincount(edge_labels, minlength=len(sizes)))))
+    src, dst = local[src[edge_order]], local[dst[edge_order]]
+
+    components = []
+    for c in range(len(sizes)):
+        e = slice(edge_starts[c], edge_starts[c + 1])
+        components.append(Component(order[starts[c]:starts[c + 1]] + 1, src[e], dst[e]))
+    components.sort(key=len, reverse=True)
+    return components
+
+
+def walk(k, src, dst, start):
+    # the vertices of a path or cycle component in order, beginning at start
+    adj = [[] for _ in range(k + 1)]
+    for u, v in zip(src.tolist(), dst.tolist()):
+        adj[u].append(v)
+        adj[v].append(u)
+    order = [start]
+    prev = 0
+    while len(order) < k:
+        nxt = adj[order[-1]][0] if adj[order[-1]][0] != prev else adj[order[-1]][1]
+        prev = order[-1]
+        order.append(nxt)
+    return order
+
+
+def closed_form(component):
+    # an optimal DS (local ids) for isolated vertices, graphs with a universal vertex (stars),
+    # paths and cycles, or None if the component is none of these
+    k, m = len(component), component.number_of_edges()
+    if k == 1:
+        return {1}
+    degrees = np.bincount(np.concatenate((component.src, component.dst)), minlength=k + 1)[1:]
+    if degrees.max() == k - 1:
+        return {int(np.argmax(degrees)) + 1}
+    if degrees.max() > 2:
+        return None
+    if m == k - 1:
+        # path: every third vertex starting with the second, plus the last one if it is left over
+        order = walk(k, component.src, component.dst, int(np.argmin(degrees)) + 1)
+        ds = set(order[1::3])
+        if k % 3 == 1:
+            ds.add(order[-1])
+        return ds
+    if m == k:
+        return set(walk(k, component.src, component.dst, 1)[::3])
+    return None
+
+
+def solve_task(task):
+    # seeds the global rng of a pool worker, the process is ours
+    solver, g, seed = task
+    random.seed(seed)
+    return solver(g)
+
+
+def solve_seeded(task):
+    # same seeding in the caller's process, with the caller's rng state put back afterwards
+    state = random.getstate()
+    try:
+        return solve_task(task)
+    finally:
+        random.setstate(state)
+
+
+def solve_by_components(g, solver=exact_ds, workers=None):
+    # minimum DS of a disconnected graph is the union of per-component optima: trivial components
+    # are solved in closed form, the rest by solver (graph with vertices 1..k -> set of vertices),
+    # in a process pool when workers is given. solver must then be a module-level function
+    ds = set()
+    rest = []
+    for component in split_components(g):
+        local = closed_form(component)
+        if local is None:
+            rest.append(component)
+        else:
+            ds |= component.lift(local)
+
+    tasks = [(solver, c.graph(), random.randrange(2 ** 32)) for c in rest]
+    if workers and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(solve_task, tasks))
+    else:
+        results = [solve_seeded(task) for task in tasks]
+    for component, local in zip(rest, results):
+        ds |= component.lift(local)
+    return ds
+
+
+if __name__ == "__main__":
+    g = load_graph(f"./exact_graphs/exact_001.gr", CACHE_DIR)
+    components = split_components(g)
+    print(f"Components: {len(components)} Trivial: {sum(closed_form(c) is not None for c in components)}")
+
+    start = time()
+    print(f"DS: {len(solve_by_components(g))} Time: {time() - start}")
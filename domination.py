@@ -0,0 +1,125 @@
+import random
+
+
+class CoverState:
+    # a dominating set together with, for every vertex, the number of its closed neighbours in the set
+    def __init__(self, adj, ds):
+        self.adj = adj
+        self.n = len(adj) - 1
+        self.ds = set()
+        self.members = []
+        self.pos = {}
+        self.cover = [0] * (self.n + 1)
+        for v in ds:
+            self.add(v)
+
+    def __len__(self):
+        return len(self.members)
+
+    def add(self, v):
+        if v in self.ds:
+            return
+        self.ds.add(v)
+        self.pos[v] = len(self.members)
+        self.members.append(v)
+        cover = self.cover
+        cover[v] += 1
+        for u in self.adj[v]:
+            cover[u] += 1
+
+    def remove(self, v):
+        self.ds.remove(v)
+        idx = self.pos.pop(v)
+        last = self.members.pop()
+        if last != v:
+            self.members[idx] = last
+            self.pos[last] = idx
+        cover = self.cover
+        cover[v] -= 1
+        for u in self.adj[v]:
+            cover[u] -= 1
+
+    def propose(self, k):
+        # removes k random vertices and greedily repairs domination; the counters are patched
+        # while the repair runs and restored before returning, so the state itself is untouched.
+        # returns the move as (removed, added)
+        removed = random.sample(self.members, k)
+        added = []
+        adj = self.adj
+        cover = self.cover
+
+        for ver in removed:
+            cover[ver] -= 1
+            for u in adj[ver]:
+                cover[u] -= 1
+
+        for ver in removed:
+            for u in adj[ver]:
+                if cover[u] == 0:
+                    added.append(u)
+                    cover[u] += 1
+                    for w in adj[u]:
+                        cover[w] += 1
+            if cover[ver] == 0:
+                w = adj[ver][0] if adj[ver] else ver
+                added.append(w)
+                cover[w] += 1
+                for x in adj[w]:
+                    cover[x] += 1
+
+        for ver in removed:
+            cover[ver] += 1
+            for u in adj[ver]:
+                cover[u] += 1
+        for ver in added:
+            cover[ver] -= 1
+            for u in adj[ver]:
+                cover[u] -= 1
+        return removed, added
+
+    def commit(self, removed, added):
+        for v in removed:
+            self.remove(v)
+        for v in added:
+            self.add(v)
+
+    def redundant(self, v):
+        # v can leave the set iff v and all its neighbours have another dominator
+        cover = self.cover
+        if cover[v] < 2:
+            return False
+        for u in self.adj[v]:
+            if cover[u] < 2:
+                return False
+        return True
+
+    def prune(self, order):
+        # one pass in the given order; every test and removal costs O(deg), so O(m) in total
+        for v in order:
+            if v in self.ds and self.redundant(v):
+                self.remove(v)
+
+    def is_dominating(self):
+        return 0 not in self.cover[1:]
+
+
+def removal_order(adj, ds, order='degree', weights=None):
+    # vertices that should leave the set first come first
+    vertices = list(ds)
+    if order == 'degree':
+        vertices.sort(key=lambda v: len(adj[v]))
+    elif order == 'random':
+        random.shuffle(vertices)
+    elif order == 'lp':
+        if weights is None:
+            raise ValueError("'lp' order needs the LP values as weights")
+        vertices.sort(key=lambda v: weights[v])
+    elif order is not None:
+        raise ValueError(f"unknown removal order: {order}")
+    return vertices
+
+
+def prune_redundant(adj, ds, order='degree', weights=None):
+    state = CoverState(adj, ds)
+    state.prune(removal_order(adj, state.members, order, weights))
+    return state.ds
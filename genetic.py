@@ -1,88 +1,146 @@
-from local_search import DSAnnealing
-from lower_bound_lp import LpGraphSolver
+from local_search import DSAnnealing, lp_start
+from lower_bound_lp import solve_residual
 import networkx as nx
+import os
 import random
 from math import floor, exp
 from time import time
+from graph_io import load_graph, adjacency_lists, CACHE_DIR
+from parallel import graph_pool, worker_csr, worker_adjacency
+from domination import prune_redundant
+from solution import Solution
+from solution_io import write_solution
+import profiling
+
+
+def init_member(g, seed, time_limit=None, start=None):
+    random.seed(seed)
+    g_lp_anneal = DSAnnealing(g, 'lp', start)
+    g_lp_anneal.annealing(temp_base=0.04, time_limit=time_limit)
+    return g_lp_anneal.solution()
+
+
+def cross_sets(adj, ds1, ds2):
+    # the vertices both parents agree on stay; only what they leave undominated is solved again
+    common = ds1 & ds2
+    flags, lp_values = solve_residual(adj, common.flags)
+    ds = Solution(common.n, flags)
+    return Solution.from_set(ds.n, prune_redundant(adj, ds, 'lp', lp_values))
+
+
+# wrappers executed in pool workers, which hold the graph attached from shared memory
+def init_member_task(args):
+    return init_member(worker_csr(), *args)
+
+
+def cross_task(pair):
+    return cross_sets(worker_adjacency(), *pair)
 
 
 class DSGenetic:
-    def __init__(self, g: nx.Graph):
-        self.population = list()
-        for i in range(20):
-          g_lp_anneal = DSAnnealing(g, 'lp')
-          g_lp_anneal.annealing(0.04)
-          self.population.append(g_lp_anneal.ds)
-
-        print("init_finish")
-        self.n = len(g.nodes)
+    def __init__(self, g: nx.Graph, workers=None, time_limit=None):
+        # time_limit: seconds for the whole run; half of it goes to building the population
+        self.deadline = None if time_limit is None else time() + time_limit
+        self.n = g.number_of_nodes()
         self.g = g
+        self.adj = adjacency_lists(g)
         self.best = float('inf')
-        self.best_ds = []
+        self.shared, self.pool = graph_pool(g, workers) if workers else (None, None)
+
+        seeds = [random.randrange(2 ** 32) for _ in range(20)]
+        # with a pool the work happens in the workers; only the wall time is profiled here
+        with profiling.timer('genetic.init'):
+            # every member starts from the same LP rounding, so the LP is solved once
+            start = lp_start(g)
+            # each member anneals for its share of what is left of the first half of the budget
+            rounds = -(-len(seeds) // (workers or 1))
+            member_limit = None if time_limit is None else max(self.deadline - time_limit / 2 - time(), 0) / rounds
+            if self.pool is not None:
+                tasks = [(seed, member_limit, start) for seed in seeds]
+                self.population = list(self.pool.map(init_member_task, tasks))
+            else:
+                self.population = []
+                for seed in seeds:
+                    if self.population and self.deadline is not None and time() > self.deadline:
+                        break
+                    self.population.append(init_member(g, seed, member_limit, start))
+        # the answer if the budget runs out before the first generation
+        self.best_ds = min(self.population, key=len)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.shared.close()
+            self.pool = None
+
+    def write_solution(self, out):
+        write_solution(self.best_ds, out)
 
     def move(self, idx):
         ds = self.population[idx]
-        ver = random.choice(tuple(ds))
+        ver = int(random.choice(ds.vertices()))
         new_ds = ds.copy()
         new_ds.remove(ver)
-        for neighbor in self.g.neighbors(ver):
-          if neighbor == ver:
-            continue
+        for neighbor in self.adj[ver]:
           if neighbor not in new_ds:
             flag = False
-            for neighbor2 in self.g.neighbors(neighbor):
+            for neighbor2 in self.adj[neighbor]:
               if neighbor2 in new_ds:
                 flag = True
+                break
             if not flag:
               new_ds.add(neighbor)
         flag = False
-        for neighbor in self.g.neighbors(ver):
+        for neighbor in self.adj[ver]:
           if neighbor in new_ds:
             flag = True
+            break
         if not flag:
-          if len(list(self.g.neighbors(ver))) > 0:
-            new_ds.add(next(self.g.neighbors(ver)))
+          if len(self.adj[ver]) > 0:
+            new_ds.add(self.adj[ver][0])
           else:
             return ds
         return new_ds
 
     def cross(self, idx1, idx2):
-        ds1 = self.population[idx1]
-        ds2 = self.population[idx2]
-
-        ds = ds1 & ds2  # intersection
-
-        g_lp = LpGraphSolver(self.g, ds)
-        g_lp.SolveLP()
-        g_lp.LpRoundingDS()
-        ds = set(filter(lambda x: g_lp.roundingds[x] == 1, range(1, self.n + 1)))
-
-        return ds
+        return cross_sets(self.adj, self.population[idx1], self.population[idx2])
 
     def work(self, temp=0.05, alpha=0.1):
         steps = 0
 
         while temp > 0.01:
+            if self.deadline is not None and time() > self.deadline:
+                break
             # MOVES
-            for i in range(len(self.population)):
-                for _ in range(10):
-                    new_ds = self.move(i)
-                    new_size = len(new_ds)
-                    size = len(self.population[i])
-                    normalized_delta = (size - new_size) / size
-                    try:
-                        prob = min(exp(normalized_delta * floor(self.n * alpha) / temp), 1.0)
-                    except OverflowError:
-                        prob = 1.0 if normalized_delta > 0 else 0.0
-                    rand_n = random.random()
-                    if prob >= rand_n:
-                        self.population[i] = new_ds
+            with profiling.timer('genetic.moves'):
+                for i in range(len(self.population)):
+                    for _ in range(10):
+                        new_ds = self.move(i)
+                        new_size = len(new_ds)
+                        size = len(self.population[i])
+                        normalized_delta = (size - new_size) / size
+                        try:
+                            prob = min(exp(normalized_delta * floor(self.n * alpha) / temp), 1.0)
+                        except OverflowError:
+                            prob = 1.0 if normalized_delta > 0 else 0.0
+                        rand_n = random.random()
+                        if prob >= rand_n:
+                            self.population[i] = new_ds
 
             # CROSSOVER
-            children = []
-            for i in range(len(self.population)):
-                for j in range(i + 1, len(self.population)):
-                    children.append(self.cross(i, j))
+            with profiling.timer('genetic.crossover'):
+                pairs = [(i, j) for i in range(len(self.population)) for j in range(i + 1, len(self.population))]
+                if self.pool is not None:
+                    tasks = [(self.population[i], self.population[j]) for i, j in pairs]
+                    children = list(self.pool.map(cross_task, tasks, chunksize=4))
+                else:
+                    children = []
+                    for i, j in pairs:
+                        if self.deadline is not None and time() > self.deadline:
+                            break
+                        children.append(self.cross(i, j))
+            if len(children) < len(pairs):
+                break
 
             # SELECTION
             self.population = sorted(self.population, key=lambda x: len(x))
@@ -93,6 +151,8 @@ class DSGenetic:
 
             temp *= 0.9
             current_best = len(self.population[0])
+            profiling.count('genetic.generations')
+            profiling.sample('genetic.best', current_best)
             if self.best == current_best:
                 steps += 1
             else:
@@ -102,21 +162,10 @@ class DSGenetic:
 
             if steps >= 3:
                 break
-        return self.best
+        return len(self.best_ds)
 
 if __name__ == "__main__":
-    g = nx.Graph()
-
-    with open(f"./exact_graphs/exact_020.gr") as f:
-        line = f.readline()
-        while (line[0] == 'c'):
-            line = f.readline()
-        _, problem, vertices, edges = line.split()
-        vertices, edges = int(vertices), int(edges)
-        g.add_nodes_from(range(1, vertices + 1))
-        for i in range(edges):
-            v, u = map(int, f.readline().split())
-            g.add_edge(v, u)
+    g = load_graph(f"./exact_graphs/exact_020.gr", CACHE_DIR)
 
     start = time()
     g_lp_anneal = DSAnnealing(g, 'lp')
@@ -124,5 +173,6 @@ if __name__ == "__main__":
     print(len(g_lp_anneal.ds))
     print(f"LP: {g_lp_anneal.annealing()} Time: {time() - start}")
     start = time()
-    genetic = DSGenetic(g)
-    print(f"GENETIC: {genetic.work()} Time: {time() - start}")
\ No newline at end of file
+    genetic = DSGenetic(g, workers=os.cpu_count())
+    print(f"GENETIC: {genetic.work()} Time: {time() - start}")
+    genetic.close()
\ No newline at end of file
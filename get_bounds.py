@@ -1,11 +1,16 @@
 import os
-import networkx as nx
-from lower_bound_lp import LpGraphSolver
-from local_search import DSAnnealing
+import argparse
 import csv
-from math import ceil
+import json
+import random
+from solvers import SOLVERS, ALIASES, solve
+from graph_io import read_gr, CACHE_DIR
+import profiling
+from solution_io import write_solution
+from time import time
 import signal
 from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 class TimeoutException(Exception):
     pass
@@ -23,78 +28,111 @@ def time_limit(seconds):
 
 directory = './exact_graphs'
 
+
+FIELDS = ['graph', 'vertices', 'algorithm', 'seed', 'result', 'time']
+
+
+def run_job(filepath, algorithm, seed, timeout, profile_dir=None, solution_dir=None):
+    # runs in a worker process; the alarm only ever fires in that worker's main thread
+    random.seed(seed)
+    if profile_dir is not None:
+        profiling.reset()
+        profiling.enable()
+    g = read_gr(filepath, CACHE_DIR)
+    start = time()
+    try:
+        # annealing stops itself at the soft deadline with its best DS; the alarm is only a backstop
+        with time_limit(timeout):
+            result = solve(algorithm, g, start + timeout - 1 - time())
+    except TimeoutException:
+        result = 'TIMEOUT'
+    if not isinstance(result, (int, float, str)):
+        # a DS: recorded by its size, and written out in full when asked for
+        if solution_dir is not None:
+            write_solution(result, os.path.join(solution_dir, f"{os.path.basename(filepath)}.{algorithm}.{seed}.sol"))
+        result = len(result)
+    row = {'graph': os.path.basename(filepath), 'vertices': g.number_of_nodes(), 'algorithm': algorithm,
+           'seed': seed, 'result': result, 'time': round(time() - start, 3)}
+    if profile_dir is not None:
+        profiling.export(os.path.join(profile_dir, f"{row['graph']}.{algorithm}.{seed}.json"), **row)
+    return row
+
+
+def read_done(path):
+    # (graph, algorithm, seed) of every row already in the results file
+    if not os.path.isfile(path):
+        return set()
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            rows = list(csv.DictReader(f))
+            if rows and set(FIELDS) - set(rows[0]):
+                raise ValueError(f"{path} has a different header, pass another --out")
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    return {(row['graph'], row['algorithm'], int(row['seed'])) for row in rows}
+
+
+class ResultWriter:
+    # appends one row per finished job and flushes it, so an interrupted sweep can be resumed
+    def __init__(self, path):
+        self.csv = path.endswith('.csv')
+        new = not os.path.isfile(path) or os.path.getsize(path) == 0
+        self.f = open(path, 'a', newline='')
+        if self.csv:
+            self.writer = csv.DictWriter(self.f, fieldnames=FIELDS)
+            if new:
+                self.writer.writeheader()
+
+    def write(self, row):
+        if self.csv:
+            self.writer.writerow(row)
+        else:
+            self.f.write(json.dumps(row) + '\n')
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+def run_batch(graph_dir, algorithms, seeds, timeout, out, workers=None, profile_dir=None, solution_dir=None):
+    done = read_done(out)
+    files = [os.path.join(graph_dir, name) for name in os.listdir(graph_dir) if name.endswith('.gr')]
+    # biggest instances first so that they do not end up as the stragglers of the sweep
+    files.sort(key=os.path.getsize, reverse=True)
+    jobs = [(filepath, algorithm, seed) for filepath in files for algorithm in algorithms for seed in seeds
+            if (os.path.basename(filepath), algorithm, seed) not in done]
+    print(f"{len(jobs)} jobs to run, {len(done)} already in {out}")
+
+    for d in (profile_dir, solution_dir):
+        if d is not None:
+            os.makedirs(d, exist_ok=True)
+    writer = ResultWriter(out)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_job, filepath, algorithm, seed, timeout, profile_dir, solution_dir)
+                       for filepath, algorithm, seed in jobs]
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    # not recorded, so a resumed sweep retries the job
+                    print(f"job failed: {future.exception()!r}")
+                    continue
+                row = future.result()
+                writer.write(row)
+                print(row)
+    finally:
+        writer.close()
+
+
 if __name__ == "__main__":
-    """
-    with open('results.csv', 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-
-        # Write header
-        writer.writerow(['graph', 'vertices', 'edges', 'LP_lower_bound', 'Best_upper_bound',
-                         'Ln_approx', 'Ln_approx_annealing',
-                         'LpRound_approx', 'LpRound_approx_annealing'])
-
-        for filename in os.listdir(directory):
-            if not filename.endswith('.gr'):
-                continue
-            g = nx.Graph()
-            graph = filename
-            vertices, edges = 0, 0
-            filepath = os.path.join(directory, filename)
-            if not os.path.isfile(filepath):
-                raise FileExistsError
-            with open(filepath) as f:
-                line = f.readline()
-                while (line[0] == 'c'):
-                    line = f.readline()
-                _, problem, vertices, edges = line.split()
-                vertices, edges = int(vertices), int(edges)
-                g.add_nodes_from(range(1, vertices + 1))
-                for i in range(edges):
-                    v, u = map(int, f.readline().split())
-                    g.add_edge(v, u)
-            lp_lower_bound = ceil(LpGraphSolver(g).SolveDominatingSet())
-            ds_annealing_ln = DSAnnealing(g, 'ln')
-            ln_approx = len(ds_annealing_ln.ds)
-            ln_approx_anneal = ds_annealing_ln.annealing()
-            ds_annealing_lp = DSAnnealing(g, 'lp')
-            lp_approx = len(ds_annealing_lp.ds)
-            lp_approx_anneal = ds_annealing_lp.annealing(0.05)
-            best_anneal = min(ln_approx_anneal, lp_approx_anneal)
-            writer.writerow([graph, vertices, edges, lp_lower_bound, best_anneal,
-                             ln_approx, ln_approx_anneal,
-                             lp_approx, lp_approx_anneal])
-        """
-    with open('results.csv', 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-
-        # Write header
-        writer.writerow(['graph', 'vertices', 'LpRoundAnnealing'])
-
-        for filename in sorted(os.listdir(directory)):
-            if not filename.endswith('.gr'):
-                continue
-            g = nx.Graph()
-            graph = filename
-            vertices = 0
-            filepath = os.path.join(directory, filename)
-            if not os.path.isfile(filepath):
-                raise FileExistsError
-            with open(filepath) as f:
-                line = f.readline()
-                while (line[0] == 'c'):
-                    line = f.readline()
-                _, problem, vertices, edges = line.split()
-                vertices = int(vertices)
-                g.add_nodes_from(range(1, vertices + 1))
-                for i in range(int(edges)):
-                    v, u = map(int, f.readline().split())
-                    g.add_edge(v, u)
-
-            try:
-                with time_limit(40):  # 40 second timeout
-                    ds_annealing_lp = DSAnnealing(g, 'lp')
-                    lp_approx_anneal = ds_annealing_lp.annealing('poly')
-            except TimeoutException:
-                lp_approx_anneal = 'TIMEOUT'
-
-            writer.writerow([graph, vertices, lp_approx_anneal])
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run (instance, algorithm, seed) jobs in parallel")
+    parser.add_argument('--dir', default=directory)
+    parser.add_argument('--algos', nargs='+', default=['LpRoundAnnealing'], choices=sorted(ALIASES) + sorted(SOLVERS))
+    parser.add_argument('--seeds', nargs='+', type=int, default=[0])
+    parser.add_argument('--timeout', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default='results.jsonl', help="results file, .csv or .jsonl")
+    parser.add_argument('--profile', default=None, help="directory for one profiling report (JSON) per job")
+    parser.add_argument('--solutions', default=None, help="directory for one PACE solution file per job")
+    args = parser.parse_args()
+
+    run_batch(args.dir, args.algos, args.seeds, args.timeout, args.out, args.workers, args.profile, args.solutions)
@@ -0,0 +1,218 @@
+import hashlib
+import os
+import numpy as np
+import profiling
+
+CACHE_DIR = './.gr_cache'
+
+
+class CSRGraph:
+    # vertices are 1..n like in the .gr files, row 0 is an empty dummy
+    def __init__(self, n, indptr, indices):
+        self.n = n
+        self.indptr = indptr
+        self.indices = indices
+
+    def number_of_nodes(self):
+        return self.n
+
+    def number_of_edges(self):
+        return len(self.indices) // 2
+
+    def neighbors(self, v):
+        return self.indices[self.indptr[v]:self.indptr[v + 1]]
+
+    def gather(self, vs):
+        # the neighbours of all the vertices in vs, concatenated, without a python loop
+        starts, ends = self.indptr[vs], self.indptr[vs + 1]
+        lengths = ends - starts
+        offsets = np.cumsum(lengths) - lengths
+        return self.indices[np.repeat(starts - offsets, lengths) + np.arange(int(lengths.sum()))]
+
+    def degree(self, v):
+        return int(self.indptr[v + 1] - self.indptr[v])
+
+    def degrees(self):
+        return np.diff(self.indptr)
+
+    def edges(self):
+        src = np.repeat(np.arange(self.n + 1, dtype=self.indices.dtype), self.degrees())
+        mask = src < self.indices
+        return src[mask], self.indices[mask]
+
+    def to_networkx(self):
+        import networkx as nx
+        g = nx.Graph()
+        g.add_nodes_from(range(1, self.n + 1))
+        src, dst = self.edges()
+        g.add_edges_from(zip(src.tolist(), dst.tolist()))
+        return g
+
+    def __repr__(self):
+        return f"CSRGraph with {self.n} nodes and {self.number_of_edges()} edges"
+
+
+def parse_gr(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    pos = 0
+    while data[pos:pos + 1] == b'c':
+        pos = data.index(b'\n', pos) + 1
+    end = data.find(b'\n', pos)
+    if end == -1:
+        end = len(data)
+    _, problem, vertices, edges = data[pos:end].split()
+    vertices, edges = int(vertices), int(edges)
+    body = data[end + 1:]
+    if body.startswith(b'c') or b'\nc' in body:
+        body = b'\n'.join(line for line in body.split(b'\n') if not line.startswith(b'c'))
+    flat = np.fromstring(body, dtype=np.int64, sep=' ') if body.strip() else np.empty(0, dtype=np.int64)
+    if len(flat) != 2 * edges:
+        raise ValueError(f"{path}: expected {edges} edges, found {len(flat) / 2}")
+    return vertices, flat.reshape(-1, 2)
+
+
+def edges_to_csr(n, edges):
+    u, v = edges[:, 0], edges[:, 1]
+    loops = u == v
+    if loops.any():
+        u, v = u[~loops], v[~loops]
+    src = np.concatenate((u, v))
+    dst = np.concatenate((v, u))
+    keys = np.sort(src * (n + 1) + dst)
+    if len(keys) > 1:
+        keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+    src, dst = keys // (n + 1), keys % (n + 1)
+    indptr = np.zeros(n + 2, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n + 1), out=indptr[1:])
+    return CSRGraph(n, indptr, dst.astype(np.int32))
+
+
+def to_csr(g):
+    if isinstance(g, CSRGraph):
+        return g
+    edges = np.array(list(g.edges()), dtype=np.int64).reshape(-1, 2)
+    return edges_to_csr(g.number_of_nodes(), edges)
+
+
+def file_digest(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def read_gr(path, cache_dir=None, mmap=False):
+    if cache_dir is None:
+        with profiling.timer('io.parse'):
+            n, edges = parse_gr(path)
+            return edges_to_csr(n, edges)
+
+    base = os.path.join(cache_dir, file_digest(path))
+    mode = 'r' if mmap else None
+    try:
+        with profiling.timer('io.cache'):
+            # plain ndarray views of the maps: slicing a np.memmap goes through a python __getitem__
+            indptr = np.asarray(np.load(base + '.indptr.npy', mmap_mode=mode))
+            indices = np.asarray(np.load(base + '.indices.npy', mmap_mode=mode))
+            return CSRGraph(len(indptr) - 2, indptr, indices)
+    except (FileNotFoundError, ValueError):
+        pass
+
+    os.makedirs(cache_dir, exist_ok=True)
+    if mmap:
+        # never holds the whole edge list, only the CSR arrays on disk
+        with profiling.timer('io.parse'):
+            build_store(path, base)
+        return read_gr(path, cache_dir, mmap)
+
+    with profiling.timer('io.parse'):
+        n, edges = parse_gr(path)
+        csr = edges_to_csr(n, edges)
+    # write under a temporary name so that concurrent readers never see half a file
+    for suffix, arr in (('.indices.npy', csr.indices), ('.indptr.npy', csr.indptr)):
+        tmp = f"{base}.{os.getpid()}.tmp.npy"
+        np.save(tmp, arr)
+        os.replace(tmp, base + suffix)
+    return csr
+
+
+def build_store(path, base, block=1 << 20):
+    # writes base.indptr.npy / base.indices.npy for a .gr file in passes over its edges: degrees
+    # first, then every edge scattered into its two rows of a raw memmap, then each row sorted and
+    # deduplicated. memory stays at a few arrays of n entries plus one chunk of edges
+    from solution_io import read_edges
+    pid = os.getpid()
+    n, chunks = read_edges(path)
+    degree = np.zeros(n + 1, dtype=np.int64)
+    for pairs in chunks:
+        pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+        degree += np.bincount(pairs.ravel(), minlength=n + 1)
+    indptr = np.zeros(n + 2, dtype=np.int64)
+    np.cumsum(degree, out=indptr[1:])
+
+    raw_path = f"{base}.{pid}.raw.npy"
+    raw = np.lib.format.open_memmap(raw_path, mode='w+', dtype=np.int32, shape=(int(indptr[-1]),))
+    cursor = indptr[:-1].copy()
+    for pairs in read_edges(path)[1]:
+        pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+        src = np.concatenate((pairs[:, 0], pairs[:, 1]))
+        dst = np.concatenate((pairs[:, 1], pairs[:, 0]))
+        order = np.argsort(src, kind='stable')
+        src, dst = src[order], dst[order]
+        # position of every entry within its run of equal sources
+        first = np.searchsorted(src, src)
+        raw[cursor[src] + np.arange(len(src)) - first] = dst
+        cursor += np.bincount(src, minlength=n + 1)
+    del cursor
+
+    # rows in blocks of about `block` entries; duplicate edges shrink the rows, so the final
+    # indices go to a flat file first and get their .npy header once the length is known
+    flat_path = f"{base}.{pid}.flat"
+    final = np.zeros(n + 2, dtype=np.int64)
+    with open(flat_path, 'wb') as flat:
+        first = 0
+        while first <= n:
+            last = max(int(np.searchsorted(indptr, indptr[first] + block, 'right')) - 1, first + 1)
+            last = min(last, n + 1)
+            rows = np.repeat(np.arange(first, last, dtype=np.int64), degree[first:last])
+            keys = np.sort(rows * (n + 1) + raw[indptr[first]:indptr[last]])
+            if len(keys) > 1:
+                keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+            final[first + 1:last + 1] = np.bincount(keys // (n + 1) - first, minlength=last - first)
+            (keys % (n + 1)).astype(np.int32).tofile(flat)
+            first = last
+    del raw
+    os.remove(raw_path)
+    np.cumsum(final, out=final)
+
+    tmp = f"{base}.{pid}.tmp.npy"
+    with open(tmp, 'wb') as out, open(flat_path, 'rb') as flat:
+        np.lib.format.write_array_header_1_0(out, {'descr': np.dtype(np.int32).str, 'fortran_order': False,
+                                                   'shape': (int(final[-1]),)})
+        for data in iter(lambda: flat.read(1 << 24), b''):
+            out.write(data)
+    os.remove(flat_path)
+    os.replace(tmp, base + '.indices.npy')
+    np.save(tmp, final)
+    os.replace(tmp, base + '.indptr.npy')
+
+
+def load_graph(path, cache_dir=None):
+    csr = read_gr(path, cache_dir)
+    with profiling.timer('io.networkx'):
+        return csr.to_networkx()
+
+
+def adjacency_lists(g):
+    # plain python lists are much faster to walk in tight loops than networkx views or numpy slices
+    if isinstance(g, CSRGraph):
+        flat = g.indices.tolist()
+        bounds = g.indptr.tolist()
+        return [flat[bounds[v]:bounds[v + 1]] for v in range(g.n + 1)]
+    n = g.number_of_nodes()
+    adj = [[]]
+    for v in range(1, n + 1):
+        adj.append([u for u in g.neighbors(v) if u != v])
+    return adj
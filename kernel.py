@@ -1,6 +1,9 @@
-import networkx as nx
-import pulp
-import random
+from __future__ import annotations
+from collections import deque
+from typing import TYPE_CHECKING
+import profiling
+if TYPE_CHECKING:
+    import networkx as nx
 
 
 def exact_min_dominating_set(G):
@@ -9,6 +12,8 @@ def exact_min_dominating_set(G):
     Requires PuLP (`pip install pulp`).
     Returns a set of nodes forming a minimum dominating set.
     """
+    import pulp
+
     # Create the ILP problem
     prob = pulp.LpProblem("Minimum_Dominating_Set", pulp.LpMinimize)
 
@@ -32,178 +37,212 @@ def exact_min_dominating_set(G):
 
 
 class Kernel:
+    # Alber et al. reduction rules driven by worklists: every vertex is examined once, and after a
+    # reduction only vertices within distance 2 of the changed neighbourhoods are examined again.
+    # the input graph is left untouched; solutions of the kernel are mapped back with lift()
     def __init__(self, g: nx.Graph):
-        self.g = g
+        self.original = g
+        self.g = g.copy()
         self.neighbors = {}
         for v in g.nodes:
             self.neighbors[v] = set(g.neighbors(v))
-        #degrees = dict(g.degree())
-        #sorted_nodes = sorted(degrees.items(), key=lambda x: x[1], reverse=True)
-        #self.sample = [node for node, degree in sorted_nodes[:300]]
-        self.sample = random.sample(list(g.nodes()), 250)
-
-
-    def rules(self):
-        g = self.g
-        flag = False
-        nodes_copy = list(g.nodes())
-        # rule 1
-        for v in nodes_copy:
-            if not g.has_node(v):
-                continue
-            n1 = self.neighbors[v]
-            n1.discard(v)
-            n1_minus = set()
-            for u in n1:
-                if len(set(g.neighbors(u)).difference(n1)) <= 1: # no neighbors besides v
-                    n1_minus.add(u)
-            n1 = n1.difference(n1_minus)
-            n2 = self.neighbors[v].difference(n1)
-            n2.discard(v)
-            n2_minus = set()
-            for u in n2:
-                if len(self.neighbors[u].intersection(n1)) == 0:
-                    n2_minus.add(u)
-            n2 = n2.difference(n2_minus)
-            n3 = self.neighbors[v].difference(n1).difference(n2)
-            n3.discard(v)
-            if len(n3) > 0:
-                delete_vertices = n2.union(n3)
-                temp = delete_vertices.pop()
-                delete_vertices.add(temp)
-                if len(delete_vertices) > 1 or g.degree[temp] > 1:
-                    for w1 in delete_vertices:
-                        for w2 in self.neighbors[w1]:
-                            if w2 != w1:
-                                self.neighbors[w2].discard(w1)
-                        self.neighbors.pop(w1)
-                    g.remove_nodes_from(delete_vertices)
-                    z = max(g.nodes) + 1
-                    g.add_edge(v, z)
-                    self.neighbors[v].add(z)
-                    self.neighbors[z] = {v}
-                    flag = True
-
-        nodes_copy = list(g.nodes())
-       # rule 2
-        for v in self.sample:
-            for u in nodes_copy:
-                if u == v or not g.has_node(u) or not g.has_node(v):
+            self.neighbors[v].discard(v)
+        self.next_id = max(g.nodes, default=0) + 1
+        self.rule1_hits = 0
+        self.rule2_hits = 0
+        self.forced = set()  # vertices every minimum DS of the kernel contains
+        self.anchor = {}  # gadget vertex -> the original vertex it stands for in a solution
+        self.labels = None  # kernel_graph() vertex i -> vertex label in self.g
+        self.done = False
+
+    def delete(self, vertices):
+        touched = set()
+        for w1 in vertices:
+            for w2 in self.neighbors[w1]:
+                self.neighbors[w2].discard(w1)
+                touched.add(w2)
+            self.neighbors.pop(w1)
+        self.g.remove_nodes_from(vertices)
+        return touched.difference(vertices)
+
+    def gadget(self, anchors):
+        # a new vertex adjacent exactly to anchors
+        z = self.next_id
+        self.next_id += 1
+        self.anchor[z] = anchors[0]
+        self.neighbors[z] = set(anchors)
+        for v in anchors:
+            self.g.add_edge(v, z)
+            self.neighbors[v].add(z)
+        return z
+
+    def ball(self, vertices, radius):
+        seen = set(v for v in vertices if v in self.neighbors)
+        frontier = seen
+        for _ in range(radius):
+            nxt = set()
+            for v in frontier:
+                nxt.update(self.neighbors[v])
+            frontier = nxt.difference(seen)
+            seen.update(frontier)
+        return seen
+
+    def rule1(self, v):
+        # returns the vertices whose neighbourhood changed, or None
+        nb = self.neighbors
+        n_v = nb[v]
+        closed = n_v | {v}
+        n1 = {u for u in n_v if not nb[u] <= closed}
+        n2 = {u for u in n_v if u not in n1 and not nb[u].isdisjoint(n1)}
+        n3 = n_v - n1 - n2
+        if len(n3) == 0:
+            return None
+        delete_vertices = n2 | n3
+        if len(delete_vertices) == 1 and len(nb[next(iter(delete_vertices))]) <= 1:
+            return None  # the only prisoner is already a pendant of v
+        touched = self.delete(delete_vertices)
+        z = self.gadget([v])
+        self.forced.add(v)
+        self.rule1_hits += 1
+        return touched | {v, z}
+
+    def pair_candidates(self, v):
+        # partners u at distance <= 3 for which rule 2 can find a prisoner in N(v): every neighbour of
+        # such a prisoner w outside N[v] has to be in N[u], and if w has none, some exit neighbour
+        # of w has to lose its exits to N[u]
+        nb = self.neighbors
+        closed = nb[v] | {v}
+        candidates = set()
+        for w in nb[v]:
+            outside = nb[w] - closed
+            if len(outside) == 0:
+                exits = [nb[y] - closed for y in nb[w] if y != v and not nb[y] <= closed]
+                if len(exits) == 0:
                     continue
-                n1 = self.neighbors[v].union(self.neighbors[u])
-                n1.discard(v)
-                n1.discard(u)
-                n1_minus = set()
-                for w in n1:
-                    if len(self.neighbors[w].difference(n1).difference({v, u})) == 0:
-                        n1_minus.add(w)
-                n1 = n1.difference(n1_minus)
-                n2 = self.neighbors[v].union(self.neighbors[u]).difference(n1)
-                n2.discard(v)
-                n2.discard(u)
-                n2_minus = set()
-                for w in n2:
-                    if len(self.neighbors[w].intersection(n1)) == 0:
-                        n2_minus.add(w)
-                n2 = n2.difference(n2_minus)
-                n3 = self.neighbors[v].union(self.neighbors[u]).difference(n1).difference(n2)
-                n3.discard(v)
-                n3.discard(u)
-                if len(n3) > 0:
-                    solo_dominated = False
-                    for w in n2.union(n3):
-                        if self.neighbors[w].union({w}).issuperset(n3):
-                            solo_dominated = True
-                            break
-                    if solo_dominated:
-                        continue
+                outside = min(exits, key=len)
+            common = None
+            for x in outside:
+                c = nb[x] | {x}
+                common = c if common is None else common & c
+                if len(common) == 0:
+                    break
+            candidates |= common
+        candidates.discard(v)
+        return candidates
 
-                    v_neig = self.neighbors[v]
-                    u_neig = self.neighbors[u]
-                    z1 = max(g.nodes) + 1
-                    z2 = z1 + 1
-                    if n3.issubset(v_neig):
-                        if n3.issubset(u_neig):
-                            delete_vertices = n3.union(n2.difference(v_neig).difference(u_neig))
-                            temp = delete_vertices.pop()
-                            delete_vertices.add(temp)
-                            if len(delete_vertices) > 2 or (len(delete_vertices) >= 1 and g.degree[temp] > 2):
-                                for w1 in delete_vertices:
-                                    for w2 in self.neighbors[w1]:
-                                        if w2 != w1:
-                                            self.neighbors[w2].discard(w1)
-                                    self.neighbors.pop(w1)
-                                g.remove_nodes_from(delete_vertices)
-                                g.add_edge(v, z1)
-                                g.add_edge(v, z2)
-                                g.add_edge(u, z1)
-                                g.add_edge(u, z2)
-                                self.neighbors[v].add(z1)
-                                self.neighbors[v].add(z2)
-                                self.neighbors[u].add(z1)
-                                self.neighbors[u].add(z2)
-                                self.neighbors[z1] = {v, u}
-                                self.neighbors[z2] = {v, u}
-                                flag = True
-                        else:
-                            delete_vertices = n3.union(n2.difference(v_neig))
-                            temp = delete_vertices.pop()
-                            delete_vertices.add(temp)
-                            if len(delete_vertices) > 1 or (len(delete_vertices) == 1 and g.degree[temp] > 1):
-                                for w1 in delete_vertices:
-                                    for w2 in self.neighbors[w1]:
-                                        if w2 != w1:
-                                            self.neighbors[w2].discard(w1)
-                                    self.neighbors.pop(w1)
-                                g.remove_nodes_from(delete_vertices)
-                                g.add_edge(v, z1)
-                                self.neighbors[v].add(z1)
-                                self.neighbors[z1] = {v}
-                                flag = True
-                    else:
-                        if n3.issubset(u_neig):
-                            delete_vertices = n3.union(n2.difference(u_neig))
-                            temp = delete_vertices.pop()
-                            delete_vertices.add(temp)
-                            if len(delete_vertices) > 1 or (len(delete_vertices) == 1 and g.degree[temp] > 1):
-                                for w1 in delete_vertices:
-                                    for w2 in self.neighbors[w1]:
-                                        if w2 != w1:
-                                            self.neighbors[w2].discard(w1)
-                                    self.neighbors.pop(w1)
-                                g.remove_nodes_from(delete_vertices)
-                                g.add_edge(u, z1)
-                                self.neighbors[u].add(z1)
-                                self.neighbors[z1] = {u}
-                                flag = True
-                        else:
-                            delete_vertices = n3.union(n2)
-                            temp = delete_vertices.pop()
-                            delete_vertices.add(temp)
-                            if len(delete_vertices) > 2 or (len(delete_vertices) >= 1 and g.degree[temp] > 1):
-                                for w1 in delete_vertices:
-                                    for w2 in self.neighbors[w1]:
-                                        if w2 != w1:
-                                            self.neighbors[w2].discard(w1)
-                                    self.neighbors.pop(w1)
-                                g.remove_nodes_from(delete_vertices)
-                                g.add_edge(v, z1)
-                                g.add_edge(u, z2)
-                                self.neighbors[v].add(z1)
-                                self.neighbors[u].add(z2)
-                                self.neighbors[z1] = {v}
-                                self.neighbors[z2] = {u}
-                                flag = True
-        return flag
+    def rule2(self, v, u):
+        nb = self.neighbors
+        v_neig = nb[v]
+        u_neig = nb[u]
+        n_vu = (v_neig | u_neig) - {v, u}
+        closed = n_vu | {v, u}
+        n1 = {w for w in n_vu if not nb[w] <= closed}
+        n2 = {w for w in n_vu if w not in n1 and not nb[w].isdisjoint(n1)}
+        n3 = n_vu - n1 - n2
+        if len(n3) == 0:
+            return None
+        for w in n2 | n3:
+            if n3 <= nb[w] | {w}:
+                return None  # a single vertex dominates the prisoners
+
+        if n3 <= v_neig and n3 <= u_neig:
+            delete_vertices = n3 | (n2 & v_neig & u_neig)
+            if len(delete_vertices) <= 2 and len(nb[next(iter(delete_vertices))]) <= 2:
+                return None
+            anchors = [[v, u], [v, u]]
+            forced = []
+        elif n3 <= v_neig:
+            delete_vertices = n3 | (n2 & v_neig)
+            if len(delete_vertices) == 1 and len(nb[next(iter(delete_vertices))]) <= 1:
+                return None
+            anchors = [[v]]
+            forced = [v]
+        elif n3 <= u_neig:
+            delete_vertices = n3 | (n2 & u_neig)
+            if len(delete_vertices) == 1 and len(nb[next(iter(delete_vertices))]) <= 1:
+                return None
+            anchors = [[u]]
+            forced = [u]
+        else:
+            delete_vertices = n3 | n2
+            if len(delete_vertices) <= 2 and len(nb[next(iter(delete_vertices))]) <= 1:
+                return None
+            anchors = [[v], [u]]
+            forced = [v, u]
+        touched = self.delete(delete_vertices)
+        self.forced.update(forced)
+        touched.update((v, u))
+        for a in anchors:
+            touched.add(self.gadget(a))
+        self.rule2_hits += 1
+        return touched
 
     def kernelise(self):
-        g = self.g
-        x = len(g.nodes())
-        counter = 0
-        while (self.rules()):
-            if len(g.nodes) != x:
-                x = len(g.nodes)
-                counter += 1
-                print(g)
-            else:
-                break
+        with profiling.timer('kernel.kernelise'):
+            queue1 = deque(self.neighbors)
+            queue2 = deque(self.neighbors)
+            queued1 = set(queue1)
+            queued2 = set(queue2)
+            while queue1 or queue2:
+                if queue1:
+                    v = queue1.popleft()
+                    queued1.discard(v)
+                    if v not in self.neighbors:
+                        continue
+                    touched = self.rule1(v)
+                else:
+                    v = queue2.popleft()
+                    queued2.discard(v)
+                    if v not in self.neighbors:
+                        continue
+                    touched = None
+                    for u in self.pair_candidates(v):
+                        if u in self.neighbors:
+                            touched = self.rule2(v, u)
+                            if touched is not None:
+                                break
+                if touched is not None:
+                    for w in self.ball(touched, 2):
+                        if w not in queued1:
+                            queued1.add(w)
+                            queue1.append(w)
+                        if w not in queued2:
+                            queued2.add(w)
+                            queue2.append(w)
+        self.forced &= self.neighbors.keys()
+        self.done = True
+        # one sample per kernelise() call: rule hits and the vertices left
+        profiling.count('kernel.rule1_hits', self.rule1_hits)
+        profiling.count('kernel.rule2_hits', self.rule2_hits)
+        profiling.sample('kernel.pass', [self.rule1_hits, self.rule2_hits, len(self.neighbors)])
+        return self.g
+
+    def kernel_graph(self):
+        # the kernel relabelled to 1..k, the vertex numbering every solver here expects
+        if not self.done:
+            self.kernelise()
+        self.labels = [None] + sorted(self.g.nodes)
+        index = {v: i for i, v in enumerate(self.labels) if i > 0}
+        import networkx as nx
+        k = nx.Graph()
+        k.add_nodes_from(range(1, len(self.labels)))
+        k.add_edges_from((index[a], index[b]) for a, b in self.g.edges)
+        return k
+
+    def lift(self, solution):
+        # maps a DS of kernel_graph() to a DS of the original graph
+        ds = set()
+        for x in solution:
+            v = self.labels[x]
+            while v in self.anchor and not self.original.has_node(v):
+                v = self.anchor[v]
+            ds.add(v)
+        # the rules guarantee domination of every deleted vertex; this is only a safety net
+        for v in self.original.nodes:
+            if v not in ds and not any(u in ds for u in self.original.neighbors(v)):
+                ds.add(v)
+        return ds
+
+    def solve(self, solver):
+        # solver maps an nx.Graph on vertices 1..k to a dominating set of it
+        return self.lift(solver(self.kernel_graph()))
@@ -1,97 +1,315 @@
+from __future__ import annotations
 import random
-from math import exp, floor
+from typing import TYPE_CHECKING
+from math import exp, floor, log
 from approxes import approx_ln_ds, approx_greedy_ds, approx_2_ds
 from lower_bound_lp import LpGraphSolver
 from time import time
-import networkx as nx
+import numpy as np
+from graph_io import load_graph, adjacency_lists, to_csr, CACHE_DIR
+from domination import CoverState, removal_order
+from solution import Solution
+from solution_io import write_solution
+import profiling
+if TYPE_CHECKING:
+    import networkx as nx
 
-class DSAnnealing:
-    def __init__(self, g: nx.Graph, approx_type='ln'):
-        self.n = len(g.nodes)
+def lp_start(g):
+    # the 'lp' starting point: the LP values and the best of their roundings. deterministic up to
+    # the randomized roundings, so several searches can share one
+    g_lp = LpGraphSolver(g)
+    g_lp.SolveLP()
+    g_lp.LpRoundingDS_ver2()
+    g_lp.LpRoundingBest()
+    return Solution.from_indicator(g_lp.roundingbest), g_lp.lp_res
+
+
+class LocalSearch:
+    # the starting DS built by one of the approximations, kept in a CoverState, and the final
+    # pruning; shared by the annealer and the tabu search. start: a (ds, lp_values) pair from
+    # lp_start() used instead of solving the LP again, 'lp' only
+    def __init__(self, g: nx.Graph, approx_type='ln', start=None):
+        self.n = g.number_of_nodes()
         self.g = g
-        if (approx_type == 'ln'):
-            self.ds = approx_ln_ds(g)
-            self.temp = 0.1
-        elif (approx_type == '2'):
-            self.ds = approx_2_ds(g)
-            self.temp = 0.2
-        elif (approx_type == 'lp'):
-            g_lp = LpGraphSolver(g)
-            g_lp.SolveLP()
-            g_lp.LpRoundingDS_ver2()
-            self.ds = set(filter(lambda x: g_lp.roundingds2[x] == 1, range(1, self.n + 1)))
-            self.temp = 0.05
-        elif (approx_type == 'greedy'):
-            self.ds = approx_greedy_ds(g)
-            self.remove_not_needed()
-            self.temp = 0.5
-        elif (approx_type == 'no_approx'):
-            self.ds = set(range(1, self.n))
-            self.remove_not_needed()
-            self.temp = 0.1
+        self.adj = adjacency_lists(g)
+        self.lp_values = None
+        self.trace = []
+        with profiling.timer('search.init'):
+            if (approx_type == 'ln'):
+                self.state = CoverState(self.adj, approx_ln_ds(g))
+            elif (approx_type == '2'):
+                self.state = CoverState(self.adj, approx_2_ds(g))
+            elif (approx_type == 'lp'):
+                ds, self.lp_values = start if start is not None else lp_start(g)
+                self.state = CoverState(self.adj, ds)
+            elif (approx_type == 'greedy'):
+                self.state = CoverState(self.adj, approx_greedy_ds(g))
+                self.remove_not_needed()
+            elif (approx_type == 'no_approx'):
+                self.state = CoverState(self.adj, range(1, self.n))
+                self.remove_not_needed()
+
+    @property
+    def ds(self):
+        return self.state.ds
+
+    def solution(self):
+        return Solution.from_set(self.n, self.ds)
+
+    def reset(self, ds):
+        self.state = CoverState(self.adj, ds)
+
+    def check(self):
+        return self.state.is_dominating()
+
+    def write_solution(self, out):
+        write_solution(self.ds, out)
+
+    def remove_not_needed(self, order='degree'):
+        # order: 'degree', 'random', 'lp' (lowest LP value first, 'lp' start only) or None for set order
+        with profiling.timer('search.prune'):
+            self.state.prune(removal_order(self.adj, self.state.members, order, self.lp_values))
+
 
+class DSAnnealing(LocalSearch):
+    START_TEMP = {'ln': 0.1, '2': 0.2, 'lp': 0.05, 'greedy': 0.5, 'no_approx': 0.1}
+    # fewer moves than this per numpy batch cost more in overhead than they save
+    MIN_BATCH = 64
+
+    def __init__(self, g: nx.Graph, approx_type='ln', start=None):
+        super().__init__(g, approx_type, start)
+        self.temp = self.START_TEMP[approx_type]
 
     def move(self, k):
-        vers = random.sample(tuple(self.ds), k)
-        new_ds = self.ds.copy().difference(set(vers))
-        for ver in vers:
-            for neighbor in self.g.neighbors(ver):
-                if neighbor == ver:
-                    continue
-                if neighbor not in new_ds:
-                    flag = False
-                    for neighbor2 in self.g.neighbors(neighbor):
-                        if neighbor2 in new_ds:
-                            flag = True
-                    if not flag:
-                        new_ds.add(neighbor)
-            flag = False
-            for neighbor in self.g.neighbors(ver):
-                if neighbor in new_ds:
-                    flag = True
-            if not flag:
-                if len(list(self.g.neighbors(ver))) > 0:
-                    new_ds.add(next(self.g.neighbors(ver)))
-                else:
-                    new_ds.add(ver)
-        return new_ds
+        return self.state.propose(k)
+
+    def reset(self, ds):
+        super().reset(ds)
+        # the numpy counters of batch_moves no longer match the new state
+        self.synced = False
+
+    def closed_gather(self, vs, owners):
+        # (vertex, owner) pairs for the closed neighbourhoods of vs
+        csr = self.csr
+        deg = csr.indptr[vs + 1] - csr.indptr[vs]
+        return np.concatenate((vs, csr.gather(vs))), np.concatenate((owners, np.repeat(owners, deg)))
+
+    def batch_moves(self, k, batch, alpha, rng):
+        # draws `batch` moves of k removals each and evaluates them all at once on numpy copies of
+        # the counters (self.cover, self.in_ds). the repair differs from propose(): it is a swap
+        # when one vertex dominates everything the removals left undominated, else those vertices
+        # are added themselves. accepted moves whose 2-hop neighbourhoods meet an earlier accepted
+        # move are dropped, so the rest read disjoint counters and can all be committed.
+        # returns (proposed, committed)
+        n, csr, cover = self.n, self.csr, self.cover
+        size = len(self.state)
+        batch = min(batch, size // k)
+        if batch == 0:
+            return 0, 0
+        # distinct members in random order by rejection, unless the moves need most of the set
+        removed = rng.integers(1, n + 1, int(1.2 * batch * k * n / size) + 16)
+        removed = removed[self.in_ds[removed]]
+        _, first = np.unique(removed, return_index=True)
+        removed = removed[np.sort(first)][:batch * k]
+        if len(removed) < batch * k:
+            removed = rng.choice(np.flatnonzero(self.in_ds), batch * k, replace=False)
+        owner = np.repeat(np.arange(batch), k)
+        mark = self.mark
+        mark[removed] = owner
+
+        # a vertex is undominated under a move iff the move removes all its dominators. vertices
+        # are handled as owner * (n + 1) + vertex keys, so one sort covers the whole batch
+        hit, hit_owner = self.closed_gather(removed, owner)
+        keys, lost = np.unique(hit_owner * (n + 1) + hit, return_counts=True)
+        keys = keys[cover[keys % (n + 1)] == lost]
+
+        # a vertex outside the move that dominates all of them on its own turns the move into a swap
+        near, near_owner = self.closed_gather(*np.divmod(keys, n + 1)[::-1])
+        near_keys, reach = np.unique(near_owner * (n + 1) + near, return_counts=True)
+        full = (reach == np.bincount(keys // (n + 1), minlength=batch)[near_keys // (n + 1)])
+        near_owner, near = np.divmod(near_keys, n + 1)
+        swaps = rng.permutation(near_keys[full & (mark[near] != near_owner)])
+        swap_owner, first = np.unique(swaps // (n + 1), return_index=True)
+        swap = swaps[first] % (n + 1)
+        has_swap = np.zeros(batch, dtype=bool)
+        has_swap[swap_owner] = True
+
+        # otherwise all of them are added, and a removed vertex that is still undominated after
+        # that gets its first neighbour
+        keys_owner, keys = np.divmod(keys, n + 1)
+        rest = ~has_swap[keys_owner]
+        keys_owner, keys = keys_owner[rest], keys[rest]
+        own = mark[keys] == keys_owner
+        added_owner, added = keys_owner[~own], keys[~own]
+        lonely_owner, lonely = keys_owner[own], keys[own]
+        if len(lonely):
+            near, near_owner = self.closed_gather(added, added_owner)
+            reached = near[mark[near] == near_owner]
+            self.taken[reached] = True
+            alone = ~self.taken[lonely]
+            self.taken[reached] = False
+            lonely_owner, lonely = lonely_owner[alone], lonely[alone]
+            start = csr.indptr[lonely]
+            neighbour = np.where(csr.indptr[lonely + 1] > start, csr.indices[np.minimum(start, len(csr.indices) - 1)], lonely)
+            extra_owner, extra = np.divmod(np.unique(lonely_owner * (n + 1) + neighbour), n + 1)
+            added_owner = np.concatenate((added_owner, extra_owner))
+            added = np.concatenate((added, extra))
+        added_owner = np.concatenate((added_owner, swap_owner))
+        added = np.concatenate((added, swap))
+
+        delta = np.bincount(added_owner, minlength=batch) - k
+        prob = np.exp(np.minimum(-delta / size * floor(n * alpha) / self.temp, 0))
+        accepted = rng.random(batch) <= prob
+        mark[removed] = -1
+        if not accepted.any():
+            return batch, 0
 
+        # in each round a move wins if it is first among the remaining moves on all of its 2-hop
+        # neighbourhood; moves that meet a winner drop out, the others go to the next round
+        mask = accepted[owner]
+        near, near_owner = self.closed_gather(*self.closed_gather(removed[mask], owner[mask]))
+        claim, taken = self.claim, self.taken
+        accepted[:] = False
+        won = []
+        for _ in range(3):
+            np.minimum.at(claim, near, near_owner)
+            beaten = np.zeros(batch, dtype=bool)
+            beaten[near_owner[claim[near] != near_owner]] = True
+            claim[near] = n + 1
+            wins = ~beaten[near_owner]
+            won.append(near[wins])
+            taken[won[-1]] = True
+            accepted[near_owner[wins]] = True
+            near, near_owner = near[~wins], near_owner[~wins]
+            beaten[:] = False
+            beaten[near_owner[taken[near]]] = True
+            near, near_owner = near[~beaten[near_owner]], near_owner[~beaten[near_owner]]
+            if len(near) == 0:
+                break
+        for region in won:
+            taken[region] = False
 
-    def annealing(self, type='exp', temp_base=0.001, alpha = 0.1, cooling_rate=0.95):
+        removed, owner = removed[accepted[owner]], owner[accepted[owner]]
+        added, added_owner = added[accepted[added_owner]], added_owner[accepted[added_owner]]
+        self.in_ds[removed] = False
+        self.in_ds[added] = True
+        np.subtract.at(cover, self.closed_gather(removed, owner)[0], 1)
+        np.add.at(cover, self.closed_gather(added, added_owner)[0], 1)
+        # the moves touch disjoint vertices, so they commit like one big move
+        self.state.commit(removed.tolist(), added.tolist())
+        return batch, int(np.count_nonzero(accepted))
+
+    def annealing(self, type='exp', temp_base=0.001, alpha = 0.1, cooling_rate=0.95, callback=None, time_limit=None,
+                  batch=None):
+        # callback(self) runs after every temperature step and stops the run by returning True.
+        # with time_limit (seconds) the schedule is paced so that the temperature reaches temp_base
+        # at the deadline; the run stops there and the best DS seen is kept either way.
+        # batch: evaluate that many moves at a time with numpy (see batch_moves) instead of one by
+        # one, in the steps where the DS allows at least MIN_BATCH moves per batch.
+        # self.trace gets one (elapsed, best size, acceptance rate, temperature) sample per step
         start_temp = self.temp
+        start = time()
+        deadline = None if time_limit is None else start + time_limit
+        if type == 'poly':
+            total_steps = (start_temp / temp_base) ** 1.25 - 1
+        else:
+            total_steps = log(temp_base / start_temp) / log(cooling_rate)
+            if type == 'step':
+                total_steps *= 5
+        best_ds = set(self.ds)
+        self.trace = []
+        if batch is not None:
+            self.csr = to_csr(self.g)
+            # scratch space of the conflict check, left as found after every batch
+            self.claim = np.full(self.n + 1, self.n + 1)
+            self.taken = np.zeros(self.n + 1, dtype=bool)
+            self.mark = np.full(self.n + 1, -1)
+            rng = np.random.default_rng(random.getrandbits(64))
         k = 0
+        # the schedule position: k, or the paced step under a deadline
+        step = 0
+        self.synced = False
         while self.temp > temp_base:
             accepted_moves = 0
-            for i in range(3000):
-                new_ds = self.move(max(1, floor(self.n / 100 - 1.7 ** k)))
-                new_size = len(new_ds)
-                size = len(self.ds)
-                normalized_delta = (size - new_size) / size
-                try:
-                    prob = min(exp(normalized_delta * floor(self.n * alpha) / self.temp), 1.0)
-                except OverflowError:
-                    prob = 1.0 if normalized_delta > 0 else 0.0
-                rand_n = random.random()
-                if prob >= rand_n:
-                    self.ds = new_ds
-                    accepted_moves += 1
+            moves = 0
+            removals = max(1, floor(self.n / 100 - 1.7 ** min(step, 100)))
+            # small sets give too few moves per batch; those steps run one move at a time
+            batched = batch is not None and len(self.state) // removals >= self.MIN_BATCH
+            if batched and not self.synced:
+                # numpy copies of the counters, stale after steps that were not batched
+                self.cover = np.array(self.state.cover, dtype=np.int64)
+                self.in_ds = np.zeros(self.n + 1, dtype=bool)
+                self.in_ds[self.state.members] = True
+            self.synced = batched
+            with profiling.timer('anneal.moves'):
+                if not batched:
+                    for _ in range(3000):
+                        if deadline is not None and time() > deadline:
+                            break
+                        removed, added = self.move(removals)
+                        moves += 1
+                        size = len(self.state)
+                        new_size = size - len(removed) + len(added)
+                        normalized_delta = (size - new_size) / size
+                        try:
+                            prob = min(exp(normalized_delta * floor(self.n * alpha) / self.temp), 1.0)
+                        except OverflowError:
+                            prob = 1.0 if normalized_delta > 0 else 0.0
+                        rand_n = random.random()
+                        if prob >= rand_n:
+                            self.state.commit(removed, added)
+                            accepted_moves += 1
+                else:
+                    while moves < 3000:
+                        if deadline is not None and time() > deadline:
+                            break
+                        proposed, committed = self.batch_moves(removals, batch, alpha, rng)
+                        if proposed == 0:
+                            break
+                        moves += proposed
+                        accepted_moves += committed
+            profiling.count('anneal.proposed', moves)
+            profiling.count('anneal.accepted', accepted_moves)
+            profiling.sample('anneal.proposed', moves)
+            profiling.sample('anneal.accepted', accepted_moves)
+            profiling.sample('anneal.temp', self.temp)
             k += 1
-            if type == 'exp':
+            step = k
+            if len(self.state) < len(best_ds):
+                best_ds = set(self.ds)
+            elapsed = time() - start
+            self.trace.append((elapsed, len(best_ds), accepted_moves / max(moves, 1), self.temp))
+            if deadline is not None:
+                if elapsed >= time_limit:
+                    break
+                # the step the untimed schedule would be at after this fraction of the budget
+                step = total_steps * elapsed / time_limit
+                if type == 'poly':
+                    self.temp = start_temp / pow(1 + step, 0.8)
+                elif type == 'step':
+                    self.temp = start_temp * cooling_rate ** (step // 5)
+                else:
+                    self.temp = start_temp * cooling_rate ** step
+            elif type == 'exp':
                 self.temp *= cooling_rate
             elif type == 'poly':
                 self.temp = start_temp / pow(1 + k, 0.8)
             elif type == 'adaptive':
-                # Adjust cooling based on acceptance rate
-                acceptance_rate = accepted_moves / 1000
+                # Adjust cooling based on acceptance rate; both factors stay below 1 so the run ends
+                acceptance_rate = accepted_moves / max(moves, 1)
                 if acceptance_rate > 0.5:
                     # Cooling too fast, slow it down
-                    self.temp *= 0.9 + cooling_rate
+                    self.temp *= cooling_rate ** 0.5
                 else:
                     # Cooling too slow, speed it up
-                    self.temp *= 0.9 - cooling_rate
+                    self.temp *= cooling_rate ** 2
             elif type == 'step':
                 if k % 5 == 0:
                     self.temp *= cooling_rate
+            if callback is not None and callback(self):
+                break
+        if len(self.state) > len(best_ds):
+            self.reset(best_ds)
         self.remove_not_needed()
         if self.check():
             return len(self.ds)
@@ -99,55 +317,165 @@ class DSAnnealing:
             return 'NOT DS'
 
 
-    def check(self):
-        for i in range(1, self.n + 1):
-            if i not in self.ds:
-                flag = True
-                for j in self.g.neighbors(i):
-                    if j in self.ds:
-                        flag = False
-                if flag:
-                    return False
-        return True
-
-    def remove_not_needed(self):
-        for ver in tuple(self.ds):
-            has_neig_in_ds = False
-            all_neig_are_covered = True
-            for neig in self.g.neighbors(ver):
-                if neig == ver:
-                    continue
-                if neig in self.ds:
-                    has_neig_in_ds = True
-                else:
-                    covered = False
-                    for neig_neig in self.g.neighbors(neig):
-                        if neig_neig == ver or neig_neig == neig:
-                            continue
-                        elif neig_neig in self.ds:
-                            covered = True
-                    if not covered:
-                        all_neig_are_covered = False
-            if has_neig_in_ds and all_neig_are_covered:
-                self.ds.remove(ver)
+class DSLocalSearch(LocalSearch):
+    # swap-based local search with weighted vertices in the style of the PACE 2025 DS heuristics.
+    # every vertex has a weight, raised each step it stays undominated; score[v] is the weight v
+    # would newly dominate (v outside the DS) or minus the weight only v dominates (v in the DS).
+    # a step removes the best of `bms` sampled DS vertices that is not tabu and adds the best
+    # neighbour of a random undominated vertex that passes configuration checking (its
+    # neighbourhood changed since it was last removed). add/remove update all counters in
+    # O(sum of degrees over N[v])
+    def search(self, time_limit=10, max_steps=None, bms=50, tenure=10, callback=None):
+        # callback(self) runs whenever a smaller DS is found and stops the search by returning True;
+        # self.trace gets (elapsed, size) for every such DS
+        start = time()
+        adj = self.adj
+        n = self.n
+        self.closed = [adj[v] + [v] for v in range(n + 1)]
+        self.in_ds = bytearray(n + 1)
+        self.members = []
+        self.pos = [0] * (n + 1)
+        self.cover = list(self.state.cover)
+        self.weight = [1] * (n + 1)
+        self.score = [0] * (n + 1)
+        self.conf = bytearray([1]) * (n + 1)
+        self.age = [0] * (n + 1)
+        self.tabu = [0] * (n + 1)
+        self.uncovered = []
+        self.upos = [0] * (n + 1)
+        for v in self.state.members:
+            self.in_ds[v] = 1
+            self.pos[v] = len(self.members)
+            self.members.append(v)
+        for v in range(1, n + 1):
+            if self.cover[v] == 1:
+                for w in self.closed[v]:
+                    if self.in_ds[w]:
+                        self.score[w] -= 1
+                        break
+            elif self.cover[v] == 0:
+                self.upos[v] = len(self.uncovered)
+                self.uncovered.append(v)
+                for w in self.closed[v]:
+                    self.score[w] += 1
+
+        best = list(self.members) if not self.uncovered else None
+        self.trace = []
+        step = 0
+        while max_steps is None or step < max_steps:
+            step += 1
+            if step % 1000 == 0 and time() - start > time_limit:
+                break
+            if not self.uncovered:
+                if best is None or len(self.members) < len(best):
+                    best = list(self.members)
+                    self.trace.append((time() - start, len(best)))
+                    if callback is not None and callback(self):
+                        break
+                if len(self.members) <= 1:
+                    break
+                # shrink: drop the DS vertex whose removal uncovers the least weight
+                self.drop(max(self.members, key=lambda v: (self.score[v], -self.age[v])), step)
+                continue
+
+            # swap: one vertex out, then one in next to a random undominated vertex
+            v = None
+            for x in random.sample(self.members, min(bms, len(self.members))):
+                if self.tabu[x] <= step and (v is None or self.score[x] > self.score[v]
+                                             or (self.score[x] == self.score[v] and self.age[x] < self.age[v])):
+                    v = x
+            if v is not None:
+                self.drop(v, step)
+            u = self.uncovered[random.randrange(len(self.uncovered))]
+            w = None
+            for x in self.closed[u]:
+                if self.conf[x] and (w is None or self.score[x] > self.score[w]
+                                     or (self.score[x] == self.score[w] and self.age[x] < self.age[w])):
+                    w = x
+            if w is None:
+                w = u
+            self.take(w, step)
+            self.tabu[w] = step + tenure
+
+            for u in self.uncovered:
+                self.weight[u] += 1
+                for x in self.closed[u]:
+                    self.score[x] += 1
+
+        profiling.count('search.steps', step)
+        if best is not None:
+            self.reset(best)
+        self.remove_not_needed()
+        if self.check():
+            return len(self.ds)
+        else:
+            return 'NOT DS'
+
+    def take(self, v, step):
+        in_ds, cover, score, weight, closed = self.in_ds, self.cover, self.score, self.weight, self.closed
+        in_ds[v] = 1
+        self.pos[v] = len(self.members)
+        self.members.append(v)
+        score[v] = -score[v]
+        for u in closed[v]:
+            cover[u] += 1
+            if cover[u] == 1:
+                self.cover_vertex(u)
+                for w in closed[u]:
+                    if w != v:
+                        score[w] -= weight[u]
+            elif cover[u] == 2:
+                for w in closed[u]:
+                    if in_ds[w] and w != v:
+                        score[w] += weight[u]
+                        break
+            if u != v:
+                self.conf[u] = 1
+        self.age[v] = step
+
+    def drop(self, v, step):
+        in_ds, cover, score, weight, closed = self.in_ds, self.cover, self.score, self.weight, self.closed
+        in_ds[v] = 0
+        idx = self.pos[v]
+        last = self.members.pop()
+        if last != v:
+            self.members[idx] = last
+            self.pos[last] = idx
+        score[v] = -score[v]
+        for u in closed[v]:
+            cover[u] -= 1
+            if cover[u] == 0:
+                self.upos[u] = len(self.uncovered)
+                self.uncovered.append(u)
+                for w in closed[u]:
+                    if w != v:
+                        score[w] += weight[u]
+            elif cover[u] == 1:
+                for w in closed[u]:
+                    if in_ds[w]:
+                        score[w] -= weight[u]
+                        break
+            if u != v:
+                self.conf[u] = 1
+        self.conf[v] = 0
+        self.age[v] = step
+
+    def cover_vertex(self, u):
+        idx = self.upos[u]
+        last = self.uncovered.pop()
+        if last != u:
+            self.uncovered[idx] = last
+            self.upos[last] = idx
 
 
 if __name__ == "__main__":
-    g = nx.Graph()
-
-    with open(f"./heuristic_graphs/heuristic_001.gr") as f:
-        line = f.readline()
-        while (line[0] == 'c'):
-            line = f.readline()
-        _, problem, vertices, edges = line.split()
-        vertices, edges = int(vertices), int(edges)
-        g.add_nodes_from(range(1, vertices + 1))
-        for i in range(edges):
-            v, u = map(int, f.readline().split())
-            g.add_edge(v, u)
+    g = load_graph(f"./heuristic_graphs/heuristic_001.gr", CACHE_DIR)
 
     start = time()
     g_lp_anneal = DSAnnealing(g, 'lp')
     print(f"Lp finished Time: {time() - start}")
     print(f"Poly: {g_lp_anneal.annealing('poly')} Time: {time() - start}")
+    start = time()
+    g_search = DSLocalSearch(g, 'lp')
+    print(f"Local search: {g_search.search(40)} Time: {time() - start}")
 
@@ -1,18 +1,230 @@
-import networkx as nx
-from pulp import *
+from __future__ import annotations
 import random
 import time
 import math
 from collections import Counter
+from typing import TYPE_CHECKING
+import numpy as np
+from graph_io import load_graph, to_csr, adjacency_lists, CACHE_DIR
+from domination import prune_redundant
+from solution_io import write_solution
+import profiling
+if TYPE_CHECKING:
+    import networkx as nx
+
+# scipy, highspy and PuLP are imported on first use, so that the heuristics that only need
+# the rounding helpers or nothing from here at all start quickly
+_highspy = False
+
+
+def load_highspy():
+    # the highspy module, or None when it is not installed
+    global _highspy
+    if _highspy is False:
+        try:
+            import highspy
+            _highspy = highspy
+        except ImportError:
+            _highspy = None
+    return _highspy
+
+
+EPS = 1e-9
+
+
+def closed_neighbourhood_matrix(g):
+    # row i - 1 is the closed neighbourhood of vertex i, i.e. A + I without the dummy vertex 0
+    import scipy.sparse as sp
+    csr = to_csr(g)
+    n = csr.number_of_nodes()
+    adj = sp.csr_matrix((np.ones(len(csr.indices)), csr.indices, csr.indptr), shape=(n + 1, n + 1))
+    return (adj[1:, 1:] + sp.identity(n, format='csr')).tocsr()
+
+
+def is_integral(values):
+    return bool(np.all((values == 0.0) | (values == 1.0)))
+
+
+def closed_argmax(matrix, values):
+    # for every vertex, the closed neighbour with the largest value (the first one on ties);
+    # a segmented max over the CSR rows, 0-based like the matrix
+    x = values[matrix.indices]
+    lengths = np.diff(matrix.indptr)
+    row_max = np.maximum.reduceat(x, matrix.indptr[:-1])  # rows are never empty: v is in N[v]
+    hits = np.flatnonzero(x == np.repeat(row_max, lengths))
+    rows = np.repeat(np.arange(len(lengths)), lengths)[hits]
+    first = hits[np.r_[True, rows[1:] != rows[:-1]]]
+    return matrix.indices[first]
+
+
+def repair(matrix, values, chosen):
+    # adds to the chosen vertices (bool array over 1..n, 0-based) the best closed neighbour of
+    # the vertices they leave undominated, so the result is a dominating set. like a pass in
+    # vertex order it skips vertices that an earlier pick already dominates: in every round an
+    # undominated vertex only picks if no smaller undominated vertex picked into its neighbourhood,
+    # and the others wait for the next round
+    chosen = chosen.copy()
+    best = closed_argmax(matrix, values)
+    undominated = np.flatnonzero(matrix @ chosen.astype(float) == 0)
+    while len(undominated):
+        picks = best[undominated]
+        # the smallest vertex picking each column; undominated is sorted, so the first occurrence
+        columns, first = np.unique(picks, return_index=True)
+        picker = np.full(matrix.shape[1], len(matrix.indptr))
+        picker[columns] = undominated[first]
+        rows = matrix[undominated]
+        earliest = np.minimum.reduceat(picker[rows.indices], rows.indptr[:-1])
+        chosen[picks[earliest == undominated]] = True
+        undominated = undominated[earliest != undominated]
+        undominated = undominated[matrix[undominated] @ chosen.astype(float) == 0]
+    return chosen
+
+
+def indicator(chosen):
+    # bool array over 1..n -> 0/1 vector indexed by vertex, like the LP values
+    values = np.zeros(len(chosen) + 1)
+    values[1:] = chosen
+    return values
+
+def solve_residual(adj, fixed, ilp_size=200):
+    # completes the fixed vertices (bool array indexed by vertex) to a DS by solving only the
+    # residual problem: rows are the vertices fixed leaves undominated, columns their closed
+    # neighbours. up to ilp_size columns it is solved exactly as an ILP, otherwise as an LP that is
+    # rounded like LpRoundingDS. returns the DS and the LP values (1 on fixed vertices) as vectors
+    # indexed by vertex
+    import scipy.sparse as sp
+    dominated = fixed.copy()
+    for v in np.flatnonzero(fixed).tolist():
+        dominated[adj[v]] = True
+    undominated = np.flatnonzero(~dominated[1:]) + 1
+    values = fixed.astype(float)
+    if len(undominated) == 0:
+        return fixed.copy(), values
+
+    column = {}
+    indptr = [0]
+    indices = []
+    for u in undominated.tolist():
+        for c in adj[u] + [u]:
+            indices.append(column.setdefault(c, len(column)))
+        indptr.append(len(indices))
+    candidates = np.fromiter(column, dtype=np.int64, count=len(column))
+    matrix = sp.csr_matrix((np.ones(len(indices)), indices, indptr), shape=(len(undominated), len(candidates)))
+
+    profiling.count('lp.residual_solves')
+    with profiling.timer('lp.residual'):
+        if len(candidates) <= ilp_size:
+            from scipy.optimize import milp, LinearConstraint
+            res = milp(np.ones(len(candidates)), constraints=LinearConstraint(matrix, lb=1),
+                       integrality=np.ones(len(candidates)), bounds=(0, 1))
+            x = np.round(res.x) if res.x is not None else np.ones(len(candidates))
+        else:
+            from scipy.optimize import linprog
+            res = linprog(np.ones(len(candidates)), A_ub=-matrix, b_ub=-np.ones(len(undominated)),
+                          bounds=(0, 1), method='highs-ipm')
+            x = res.x
+    chosen = repair(matrix, x, x > 0.8)
+    ds = fixed.copy()
+    ds[candidates[chosen]] = True
+    values[candidates] = x
+    return ds, values
+
+
+class PersistentLP:
+    # the DS relaxation built once; fixings are applied as column bounds on a model kept alive in
+    # highspy (when installed). with resolve='simplex' re-solves run dual simplex warm-started from
+    # the previous basis; on degenerate random instances re-running interior point is often faster,
+    # so that stays the default
+    def __init__(self, g, resolve='ipm', time_limit=None):
+        # time_limit: seconds per solve; a solve that runs out counts as not optimal
+        with profiling.timer('lp.build'):
+            self.matrix = closed_neighbourhood_matrix(g)
+            self.resolve = resolve
+            self.time_limit = time_limit
+            self.n = self.matrix.shape[0]
+            self.lower = np.zeros(self.n)
+            self.upper = np.ones(self.n)
+            self.solves = 0
+            self.highs = None
+            highspy = load_highspy()
+            if highspy is not None:
+                self.highs = highspy.Highs()
+                self.highs.setOptionValue('output_flag', False)
+                if time_limit is not None:
+                    self.highs.setOptionValue('time_limit', float(time_limit))
+                lp = highspy.HighsLp()
+                lp.num_col_ = self.n
+                lp.num_row_ = self.n
+                lp.col_cost_ = np.ones(self.n)
+                lp.col_lower_ = self.lower
+                lp.col_upper_ = self.upper
+                lp.row_lower_ = np.ones(self.n)
+                lp.row_upper_ = np.full(self.n, highspy.kHighsInf)
+                lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+                lp.a_matrix_.num_col_ = self.n
+                lp.a_matrix_.num_row_ = self.n
+                lp.a_matrix_.start_ = self.matrix.indptr
+                lp.a_matrix_.index_ = self.matrix.indices
+                lp.a_matrix_.value_ = self.matrix.data
+                self.highs.passModel(lp)
+                # the first, cold solve is much faster with interior point; crossover leaves a basis
+                self.highs.setOptionValue('solver', 'ipm')
+
+    def solve(self, ones=[], zeros=[]):
+        # returns the LP values indexed by vertex (index 0 unused), or None if the fixings are infeasible
+        lower = np.zeros(self.n)
+        upper = np.ones(self.n)
+        lower[np.asarray(ones, dtype=np.int64) - 1] = 1
+        upper[np.asarray(zeros, dtype=np.int64) - 1] = 0
+        profiling.count('lp.solves')
+        with profiling.timer('lp.solve'):
+            if self.highs is not None:
+                x = self._solve_highs(lower, upper)
+            else:
+                from scipy.optimize import linprog
+                options = {} if self.time_limit is None else {'time_limit': float(self.time_limit)}
+                res = linprog(np.ones(self.n), A_ub=-self.matrix, b_ub=-np.ones(self.n),
+                              bounds=np.column_stack((lower, upper)), method='highs-ipm', options=options)
+                x = res.x if res.status == 0 else None
+        self.lower, self.upper = lower, upper
+        self.solves += 1
+        if x is None:
+            return None
+        values = np.zeros(self.n + 1)
+        values[1:] = x
+        # snap solver noise so that integrality checks like x == 1.0 behave
+        values[np.abs(values) < EPS] = 0.0
+        values[np.abs(values - 1) < EPS] = 1.0
+        return values
+
+    def _solve_highs(self, lower, upper):
+        changed = np.flatnonzero((lower != self.lower) | (upper != self.upper))
+        if len(changed) > 0:
+            self.highs.changeColsBounds(len(changed), changed.astype(np.int32), lower[changed], upper[changed])
+        self.highs.run()
+        if self.solves == 0 and self.resolve == 'simplex':
+            self.highs.setOptionValue('solver', 'simplex')
+            self.highs.setOptionValue('simplex_strategy', 1)  # dual
+        if self.highs.getModelStatus() != load_highspy().HighsModelStatus.kOptimal:
+            return None
+        return np.array(self.highs.getSolution().col_value)
+
 
 class LpGraphSolver:
-    def __init__(self, g: nx.Graph, temp=8, ones=[]):
+    def __init__(self, g: nx.Graph, temp=8, ones=[], backend='highs', resolve='ipm', time_limit=None):
         self.g = g
         self.n = self.g.number_of_nodes()
+        self.backend = backend
+        self.resolve = resolve
+        self.time_limit = time_limit
+        self.lp = None
         self.vc_res = []
         self.lp_res = []
         self.roundingds = []
         self.roundingds2 = []
+        self.roundingbest = []
+        self.matrix = None
+        self.adj = None
         self.temp = temp
         self.ones = ones
 
@@ -22,167 +234,124 @@ class LpGraphSolver:
 
 
     def SolveDominatingSet(self, ones=[], zeros=[]):
-        problem = LpProblem("DominatingSet", LpMinimize)
-        vars = list(LpVariable("node" + str(i), lowBound=0, upBound=1, cat="Continuous") for i in range(self.n + 1))
-        for x in ones:
-            problem += vars[x] == 1
-        for x in zeros:
-            problem += vars[x] == 0
-        problem += vars[0] == 0
-        for i in range(1, self.n + 1):  # constraints
-            problem += vars[i] + lpSum([(vars[x] if x != i else 0) for x in self.g.neighbors(i)]) >= 1
-        problem += lpSum(vars)
-        status = problem.solve(PULP_CBC_CMD(msg=False))
+        if self.backend == 'highs':
+            return self.SolveHighs(ones, zeros)
+        elif self.backend == 'pulp':
+            return self.SolvePulp(ones, zeros)
+        raise ValueError(f"unknown LP backend: {self.backend}")
+
+    def SolveHighs(self, ones=[], zeros=[]):
+        if self.lp is None:
+            self.lp = PersistentLP(self.g, self.resolve, self.time_limit)
+        values = self.lp.solve(ones, zeros)
+        if values is None:
+            raise Exception("Non optimal LP")
+        return values
+
+    def SolvePulp(self, ones=[], zeros=[]):
+        from pulp import LpProblem, LpMinimize, LpVariable, LpStatus, lpSum, value, PULP_CBC_CMD
+        profiling.count('lp.solves')
+        with profiling.timer('lp.build'):
+            problem = LpProblem("DominatingSet", LpMinimize)
+            vars = list(LpVariable("node" + str(i), lowBound=0, upBound=1, cat="Continuous") for i in range(self.n + 1))
+            for x in ones:
+                problem += vars[x] == 1
+            for x in zeros:
+                problem += vars[x] == 0
+            problem += vars[0] == 0
+            for i in range(1, self.n + 1):  # constraints
+                problem += vars[i] + lpSum([(vars[x] if x != i else 0) for x in self.g.neighbors(i)]) >= 1
+            problem += lpSum(vars)
+        with profiling.timer('lp.solve'):
+            status = problem.solve(PULP_CBC_CMD(msg=False))
         if LpStatus[status] == 'Optimal':
-            return list(value(var) for var in vars)
+            return np.array([value(var) for var in vars], dtype=float)
         else:
             raise Exception("Non optimal LP")
 
+    def Matrix(self):
+        if self.lp is not None:
+            return self.lp.matrix
+        if self.matrix is None:
+            self.matrix = closed_neighbourhood_matrix(self.g)
+        return self.matrix
+
+    def Adjacency(self):
+        if self.adj is None:
+            self.adj = adjacency_lists(self.g)
+        return self.adj
+
     def LpRoundingDS(self):
-        self.roundingds = self.lp_res.copy()
-        for i in range(1, self.n + 1):
-            if self.roundingds[i] > 0.8:
-                self.roundingds[i] = 1
-        count = 0
-        for i in range(1, self.n + 1):
-            v_val = self.roundingds[i]
-            max_neig_idx = -1
-            max_neig_val = -1
-            if v_val == 1:
-                continue
-            for j in self.g.neighbors(i):
-                if j == i:
-                    continue
-                if self.roundingds[j] > max_neig_val:
-                    max_neig_idx = j
-                    max_neig_val = self.roundingds[j]
-            if v_val > max_neig_val:
-                self.roundingds[i] = 1
-            else:
-                self.roundingds[max_neig_idx] = 1
-        for i in range(1, self.n + 1):
-            if self.roundingds[i] != 1:
-                self.roundingds[i] = 0
+        with profiling.timer('lp.rounding'):
+            values = self.lp_res.copy()
+            values[values > 0.8] = 1
+            self.roundingds = indicator(repair(self.Matrix(), values[1:], values[1:] == 1))
         return sum(self.roundingds)
 
     def LpRoundingDS_ver2(self):
-        self.roundingds2 = self.lp_res.copy()
-        iters = 0
-        while (not all(map(lambda x: x == 0.0 or x == 1.0, self.roundingds2)) and
-               any(map(lambda x: x > 0.8 and x != 1.0, self.roundingds2))):
-            ones = []
-            zeros = []
-            for i in range(1, self.n + 1):
-                if self.roundingds2[i] > 0.8:
-                    self.roundingds2[i] = 1
-                    ones.append(i)
-            self.roundingds2 = self.SolveDominatingSet(ones)
-            if iters == 5:
-                break
-            iters += 1
-
-        if all(map(lambda x: x == 0.0 or x == 1.0, self.roundingds2)):
-            return sum(self.roundingds2)
-        for i in range(1, self.n + 1):
-            v_val = self.roundingds2[i]
-            max_neig_idx = -1
-            max_neig_val = -1
-            if v_val == 1:
-                continue
-            for j in self.g.neighbors(i):
-                if j == i:
-                    continue
-                if self.roundingds2[j] > max_neig_val:
-                    max_neig_idx = j
-                    max_neig_val = self.roundingds2[j]
-            if v_val > max_neig_val:
-                self.roundingds2[i] = 1
-            else:
-                self.roundingds2[max_neig_idx] = 1
-        for i in range(1, self.n + 1):
-            if self.roundingds2[i] != 1:
-                self.roundingds2[i] = 0
-        return sum(self.roundingds2)
+        with profiling.timer('lp.rounding_v2'):
+            values = self.lp_res.copy()
+            iters = 0
+            while not is_integral(values) and np.any((values > 0.8) & (values != 1.0)):
+                values = self.SolveDominatingSet(np.flatnonzero(values > 0.8))
+                if iters == 5:
+                    break
+                iters += 1
 
+            if is_integral(values):
+                self.roundingds2 = values
+            else:
+                self.roundingds2 = indicator(repair(self.Matrix(), values[1:], values[1:] == 1))
+            return sum(self.roundingds2)
 
-    # BRANCH and BOUND Dominating set
-    def BranchBoundDS(self, take=1):
-        vertices = set()
-        return self.BranchNBoundTreeDS(vertices, [], [], take)
-
-
-    def BranchNBoundTreeDS(self, vertices, ones, zeros, take):
-        if all(map(lambda x: x == 0.0 or x == 1.0, self.lp_res)):
-            return sum(self.lp_res)
-        if len(vertices) % 10 == 0:
-            print(len(vertices))
-        v = -1
-        if len(vertices) == 0:
-            v = min(list(range(1, self.n + 1)), key=lambda x: abs(0.5 - self.lp_res[x]))
-        else:
-            ans, vals = self.SolveBoundedDS(ones, zeros)
-            v = min(list(range(1, self.n + 1)), key=lambda x: abs(0.5 - vals[x]) if not x in vertices else 100)
-        vertices.add(v)
+    def LpRoundingBest(self, thresholds=(0.9, 0.7, 0.5, 0.3), samples=8):
+        # runs every rounding strategy on lp_res, prunes the results and keeps the smallest:
+        # a threshold sweep, `samples` randomized roundings (v is picked with probability x_v) and
+        # greedy by LP value. the LP values of v's closed neighbourhood order each repair, and
+        # rounding(s) already made by LpRoundingDS / LpRoundingDS_ver2 compete as well
+        with profiling.timer('lp.rounding_best'):
+            matrix = self.Matrix()
+            values = self.lp_res[1:]
+            rng = np.random.default_rng(random.getrandbits(32))
+            candidates = [repair(matrix, values, values >= t) for t in thresholds]
+            candidates += [repair(matrix, values, rng.random(len(values)) < values) for _ in range(samples)]
+            # greedy by LP value (highest first, take v if it dominates something new) picks exactly the
+            # best closed neighbour of every vertex, i.e. a repair of the empty set
+            candidates.append(repair(matrix, values, np.zeros(len(values), dtype=bool)))
+            candidates += [np.asarray(r[1:]) == 1 for r in (self.roundingds, self.roundingds2) if len(r) > 0]
 
-        left_res, left_vals = self.SolveBoundedDS(ones + [v], zeros)
-        right_res, right_vals = self.SolveBoundedDS(ones, zeros + [v])
+            best = None
+            for chosen in candidates:
+                ds = prune_redundant(self.Adjacency(), np.flatnonzero(chosen) + 1, 'lp', self.lp_res)
+                if best is None or len(ds) < len(best):
+                    best = ds
+            self.roundingbest = np.zeros(self.n + 1)
+            self.roundingbest[list(best)] = 1
+            return len(best)
 
-        if all(map(lambda x: x == 0.0 or x == 1.0, left_vals)):
-            return left_res, len(vertices)
-        elif all(map(lambda x: x == 0.0 or x == 1.0, right_vals)):
-            return right_res, len(vertices)
 
-        if left_res > right_res:
-            if left_res - right_res > self.temp:
-                return self.BranchNBoundTreeDS(vertices, ones, zeros + [v], take)
+    def WriteSolution(self, out):
+        # the smallest of the roundings made so far
+        roundings = [r for r in (self.roundingbest, self.roundingds2, self.roundingds) if len(r) > 0]
+        if not roundings:
+            raise ValueError("no rounding to write, run one of the LpRounding methods first")
+        best = min(roundings, key=lambda r: np.count_nonzero(np.asarray(r) == 1))
+        write_solution(np.flatnonzero(np.asarray(best) == 1), out)
 
-            rnd = random.random()
-            if rnd > 0.5:
-                return self.BranchNBoundTreeDS(vertices, ones, zeros + [v], take)
-            else:
-                return self.BranchNBoundTreeDS(vertices, ones + [v], zeros, take)
-        else:
-            if right_res - left_res > self.temp:
-                return self.BranchNBoundTreeDS(vertices, ones + [v], zeros, take)
-
-            rnd = random.random()
-            if rnd > 0.5:
-                return self.BranchNBoundTreeDS(vertices, ones + [v], zeros, take)
-            else:
-                return self.BranchNBoundTreeDS(vertices, ones, zeros + [v], take)
+    # BRANCH and BOUND Dominating set
+    def BranchBoundDS(self, time_limit=None, node_limit=None):
+        from branch_bound import branch_and_bound  # branch_bound needs DSAnnealing, which imports this module
+        return branch_and_bound(self.g, time_limit, node_limit).best_ds
 
     def SolveBoundedDS(self, ones, zeros):
-        problem = LpProblem("BoundedDS", LpMinimize)
-        vars = list(LpVariable("node" + str(i), lowBound=0, upBound=1, cat="Continuous") for i in range(self.n + 1))
-        problem += vars[0] == 0
-        for i in ones:
-            problem += vars[i] == 1
-        for i in zeros:
-            problem += vars[i] == 0
-        for i in range(1, self.n + 1):  # constraints
-            problem += vars[i] + lpSum([(vars[x] if x != i else 0) for x in self.g.neighbors(i)]) >= 1
-        problem += lpSum(vars)
-        status = problem.solve(PULP_CBC_CMD(msg=False))
-        if LpStatus[status] == 'Optimal':
-            return (sum(value(var) for var in vars), list(value(var) for var in vars))
-        else:
-            raise Exception(f"bad status: {LpStatus[status]}")
+        values = self.SolveDominatingSet(ones, zeros)
+        return (sum(values), values)
 
 if __name__ == "__main__":
-    g = nx.Graph()
-
-    with open(f"./exact_graphs/exact_026.gr") as f:
-        line = f.readline()
-        while (line[0] == 'c'):
-            line = f.readline()
-        _, problem, vertices, edges = line.split()
-        vertices, edges = int(vertices), int(edges)
-        g.add_nodes_from(range(1, vertices + 1))
-        for i in range(edges):
-            v, u = map(int, f.readline().split())
-            g.add_edge(v, u)
+    g = load_graph(f"./exact_graphs/exact_026.gr", CACHE_DIR)
 
     g_lp = LpGraphSolver(g)
     g_lp.SolveLP()
     print(g_lp.LpRoundingDS())
     print(g_lp.LpRoundingDS_ver2())
+    print(g_lp.LpRoundingBest())
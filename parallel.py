@@ -0,0 +1,58 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from graph_io import CSRGraph, to_csr, adjacency_lists
+
+
+class SharedGraph:
+    # CSR arrays of a graph copied into shared memory once; worker processes attach to them in
+    # their initializer instead of receiving a pickled graph with every task
+    def __init__(self, g):
+        csr = to_csr(g)
+        self.blocks = []
+        self.handle = [csr.n]
+        for arr in (csr.indptr, csr.indices):
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            np.ndarray(arr.shape, arr.dtype, buffer=shm.buf)[:] = arr
+            self.blocks.append(shm)
+            self.handle.append((shm.name, arr.shape, arr.dtype.str))
+
+    def close(self):
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = []
+
+
+_blocks = []
+_csr = None
+_adj = None
+
+
+def attach(handle):
+    global _csr, _adj
+    n, *arrays = handle
+    views = []
+    for name, shape, dtype in arrays:
+        shm = shared_memory.SharedMemory(name=name)
+        _blocks.append(shm)
+        views.append(np.ndarray(shape, np.dtype(dtype), buffer=shm.buf))
+    _csr = CSRGraph(n, *views)
+    _adj = None
+
+
+def worker_csr():
+    return _csr
+
+
+def worker_adjacency():
+    global _adj
+    if _adj is None:
+        _adj = adjacency_lists(_csr)
+    return _adj
+
+
+def graph_pool(g, workers=None):
+    shared = SharedGraph(g)
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=attach, initargs=(shared.handle,))
+    return shared, pool
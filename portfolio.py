@@ -0,0 +1,99 @@
+import multiprocessing as mp
+import os
+import random
+from time import time
+from local_search import DSAnnealing
+from parallel import SharedGraph, attach, worker_csr
+from graph_io import load_graph, CACHE_DIR
+
+# (initializer, cooling schedule, cooling rate); chain i uses CHAINS[i % len(CHAINS)]
+CHAINS = [
+    ('lp', 'poly', 0.95),
+    ('ln', 'exp', 0.95),
+    ('greedy', 'exp', 0.9),
+    ('lp', 'step', 0.9),
+    ('ln', 'poly', 0.95),
+    ('2', 'exp', 0.98),
+    ('greedy', 'step', 0.95),
+    ('lp', 'exp', 0.98),
+]
+
+
+class Incumbent:
+    # best DS over all chains: its size and membership flags in shared memory
+    def __init__(self, n):
+        self.size = mp.Value('i', n + 1)
+        self.flags = mp.Array('b', n + 1, lock=False)
+
+    def publish(self, ds):
+        if len(ds) >= self.size.value:
+            return False
+        with self.size.get_lock():
+            if len(ds) >= self.size.value:
+                return False
+            self.flags[:] = bytes(len(self.flags))
+            for v in ds:
+                self.flags[v] = 1
+            self.size.value = len(ds)
+        return True
+
+    def load(self):
+        with self.size.get_lock():
+            flags = self.flags[:]
+        return {v for v in range(1, len(flags)) if flags[v]}
+
+
+def run_chain(handle, incumbent, seed, approx_type, schedule, cooling_rate, deadline, restart_gap):
+    attach(handle)
+    random.seed(seed)
+    g_anneal = DSAnnealing(worker_csr(), approx_type)
+    start_temp = g_anneal.temp
+    incumbent.publish(g_anneal.ds)
+
+    def step(a):
+        incumbent.publish(a.ds)
+        if len(a.ds) > incumbent.size.value * (1 + restart_gap):
+            # straggler: continue from the best set any chain has found
+            a.reset(incumbent.load())
+        return False
+
+    while time() < deadline:
+        g_anneal.annealing(schedule, cooling_rate=cooling_rate, callback=step, time_limit=deadline - time())
+        incumbent.publish(g_anneal.ds)
+        g_anneal.temp = start_temp  # reheat and keep going until the deadline
+
+
+def portfolio_annealing(g, time_limit=40, chains=None, seed=0, restart_gap=0.02):
+    # runs independent annealing chains in separate processes until the wall-clock budget is
+    # spent and returns the best DS any of them found
+    chains = chains or os.cpu_count()
+    shared = SharedGraph(g)
+    incumbent = Incumbent(g.number_of_nodes())
+    deadline = time() + time_limit
+    procs = []
+    try:
+        for i in range(chains):
+            approx_type, schedule, cooling_rate = CHAINS[i % len(CHAINS)]
+            p = mp.Process(target=run_chain, args=(shared.handle, incumbent, seed + i, approx_type, schedule,
+                                                   cooling_rate, deadline, restart_gap))
+            p.start()
+            procs.append(p)
+        for p in procs:
+            # chains stop themselves at the deadline; the grace period covers their final pruning
+            p.join(max(0.0, deadline - time()) + 5)
+            if p.is_alive():
+                p.terminate()
+                p.join()
+    finally:
+        shared.close()
+    if incumbent.size.value > g.number_of_nodes():
+        return set(range(1, g.number_of_nodes() + 1))  # no chain got past its initializer
+    return incumbent.load()
+
+
+if __name__ == "__main__":
+    g = load_graph(f"./heuristic_graphs/heuristic_001.gr", CACHE_DIR)
+
+    start = time()
+    ds = portfolio_annealing(g, 40)
+    print(f"Portfolio: {len(ds)} Time: {time() - start}")
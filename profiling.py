@@ -0,0 +1,73 @@
+import json
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+
+# named timers, counters and per-step series shared by the whole process. everything is a no-op
+# until enable() is called: hooks sit outside the innermost loops (per temperature step, per LP
+# solve, per generation), so when profiling is off they cost one flag test each
+
+_enabled = False
+_timers = defaultdict(float)
+_calls = defaultdict(int)
+_counters = defaultdict(int)
+_series = defaultdict(list)
+_off = nullcontext()
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    _timers.clear()
+    _calls.clear()
+    _counters.clear()
+    _series.clear()
+
+
+@contextmanager
+def _timed(name):
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        _timers[name] += perf_counter() - start
+        _calls[name] += 1
+
+
+def timer(name):
+    return _timed(name) if _enabled else _off
+
+
+def count(name, k=1):
+    if _enabled:
+        _counters[name] += k
+
+
+def sample(name, value):
+    if _enabled:
+        _series[name].append(value)
+
+
+def report():
+    return {
+        'timers': {name: {'seconds': round(t, 6), 'calls': _calls[name]} for name, t in sorted(_timers.items())},
+        'counters': dict(sorted(_counters.items())),
+        'series': dict(sorted(_series.items())),
+    }
+
+
+def export(path, **meta):
+    with open(path, 'w') as f:
+        json.dump(dict(meta, **report()), f, indent=1)
@@ -0,0 +1,72 @@
+import numpy as np
+
+
+class Solution:
+    # a subset of the vertices 1..n stored as a bool array (index 0 unused); membership is O(1),
+    # set algebra is vectorized and copy is a single memcpy
+    def __init__(self, n, flags=None):
+        self.n = n
+        self.flags = np.zeros(n + 1, dtype=bool) if flags is None else flags
+        self.size = int(np.count_nonzero(self.flags))
+
+    @classmethod
+    def from_set(cls, n, vertices):
+        flags = np.zeros(n + 1, dtype=bool)
+        flags[np.fromiter(vertices, dtype=np.int64)] = True
+        return cls(n, flags)
+
+    @classmethod
+    def from_indicator(cls, values):
+        # e.g. a rounded LP vector, where the chosen vertices have value 1
+        values = np.asarray(values)
+        flags = values == 1
+        flags[0] = False
+        return cls(len(values) - 1, flags)
+
+    def to_set(self):
+        return set(self.vertices().tolist())
+
+    def vertices(self):
+        return np.flatnonzero(self.flags)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, v):
+        return bool(self.flags[v])
+
+    def __iter__(self):
+        return iter(self.vertices().tolist())
+
+    def __and__(self, other):
+        return Solution(self.n, self.flags & other.flags)
+
+    def __or__(self, other):
+        return Solution(self.n, self.flags | other.flags)
+
+    def __sub__(self, other):
+        return Solution(self.n, self.flags & ~other.flags)
+
+    def __eq__(self, other):
+        return isinstance(other, Solution) and np.array_equal(self.flags, other.flags)
+
+    def copy(self):
+        return Solution(self.n, self.flags.copy())
+
+    def add(self, v):
+        if not self.flags[v]:
+            self.flags[v] = True
+            self.size += 1
+
+    def discard(self, v):
+        if self.flags[v]:
+            self.flags[v] = False
+            self.size -= 1
+
+    def remove(self, v):
+        if not self.flags[v]:
+            raise KeyError(v)
+        self.discard(v)
+
+    def __repr__(self):
+        return f"Solution with {self.size} of {self.n} vertices"
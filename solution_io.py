@@ -0,0 +1,128 @@
+import sys
+import numpy as np
+
+# PACE solution files: the size of the DS on the first line, then one vertex per line; lines
+# starting with 'c' are comments. everything here streams, so it works for graphs far larger
+# than what fits into an nx.Graph
+
+CHUNK = 1 << 22
+
+
+def write_solution(ds, out=sys.stdout):
+    # out: a path or an open text file
+    if isinstance(out, str):
+        with open(out, 'w') as f:
+            return write_solution(ds, f)
+    vertices = np.sort(np.fromiter((int(v) for v in ds), dtype=np.int64))
+    out.write(f"{len(vertices)}\n")
+    for i in range(0, len(vertices), 1 << 16):
+        out.write('\n'.join(map(str, vertices[i:i + (1 << 16)].tolist())) + '\n')
+    out.flush()
+
+
+def strip_comments(chunk):
+    if chunk.startswith(b'c') or b'\nc' in chunk:
+        return b'\n'.join(line for line in chunk.split(b'\n') if not line.startswith(b'c'))
+    return chunk
+
+
+def parse_numbers(chunk):
+    if not chunk.strip():
+        return np.empty(0, dtype=np.int64)
+    return np.fromstring(chunk, dtype=np.int64, sep=' ')
+
+
+def parse_pairs(chunk):
+    return parse_numbers(chunk).reshape(-1, 2)
+
+
+def read_chunks(path):
+    # the bytes of a file in chunks of whole lines
+    with open(path, 'rb') as f:
+        rest = b''
+        while True:
+            data = f.read(CHUNK)
+            if not data:
+                break
+            data = rest + data
+            cut = data.rfind(b'\n') + 1
+            data, rest = data[:cut], data[cut:]
+            yield data
+        if rest:
+            yield rest + b'\n'
+
+
+def read_solution(path):
+    # (declared size, vertices as an int64 array)
+    numbers = [parse_numbers(strip_comments(chunk)) for chunk in read_chunks(path)]
+    flat = np.concatenate(numbers) if numbers else np.empty(0, dtype=np.int64)
+    if len(flat) == 0:
+        raise ValueError(f"{path}: empty solution file")
+    return int(flat[0]), flat[1:]
+
+
+def read_edges(path):
+    # (n, generator of (u, v) array chunks) for a .gr file, without materialising the edge list
+    chunks = read_chunks(path)
+    header = None
+    pending = b''
+    for chunk in chunks:
+        chunk = strip_comments(pending + chunk)
+        end = chunk.find(b'\n')
+        if end == -1:
+            pending = chunk
+            continue
+        header = chunk[:end].split()
+        rest = chunk[end + 1:]
+        break
+    if header is None or len(header) != 4 or header[0] != b'p':
+        raise ValueError(f"{path}: missing 'p ds n m' line")
+
+    def edges():
+        yield parse_pairs(rest)
+        for chunk in chunks:
+            yield parse_pairs(strip_comments(chunk))
+
+    return int(header[2]), edges()
+
+
+def validate(graph_path, solution):
+    # checks a DS (a solution file path or any iterable of vertices) against a .gr file in one
+    # pass over its edges. returns a list of problems, empty if the solution is a valid DS
+    errors = []
+    if isinstance(solution, str):
+        declared, vertices = read_solution(solution)
+        if declared != len(vertices):
+            errors.append(f"declares {declared} vertices but lists {len(vertices)}")
+    else:
+        vertices = np.fromiter((int(v) for v in solution), dtype=np.int64)
+
+    n, edges = read_edges(graph_path)
+    if len(vertices) and (vertices.min() < 1 or vertices.max() > n):
+        errors.append(f"vertices outside 1..{n}")
+        vertices = vertices[(vertices >= 1) & (vertices <= n)]
+    in_ds = np.zeros(n + 1, dtype=bool)
+    in_ds[vertices] = True
+    if np.count_nonzero(in_ds) != len(vertices):
+        errors.append("duplicate vertices")
+
+    dominated = in_ds.copy()
+    for pairs in edges:
+        u, v = pairs[:, 0], pairs[:, 1]
+        dominated[u[in_ds[v]]] = True
+        dominated[v[in_ds[u]]] = True
+    undominated = np.flatnonzero(~dominated[1:]) + 1
+    if len(undominated):
+        errors.append(f"{len(undominated)} undominated vertices, e.g. {undominated[:10].tolist()}")
+    return errors
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        raise SystemExit("usage: solution_io.py <graph.gr> <solution file>")
+    problems = validate(sys.argv[1], sys.argv[2])
+    for problem in problems:
+        print(problem)
+    if problems:
+        raise SystemExit(1)
+    print(f"OK {read_solution(sys.argv[2])[0]}")
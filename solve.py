@@ -0,0 +1,31 @@
+import argparse
+import random
+import sys
+from graph_io import read_gr
+from solvers import ds_solvers, solve
+from solution_io import write_solution, validate
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve one .gr instance and print the DS in PACE format")
+    parser.add_argument('graph')
+    parser.add_argument('--algo', default='local_search', choices=ds_solvers())
+    parser.add_argument('--time-limit', type=float, default=None, help="seconds, for the solvers that take one")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache', default=None, help="directory for the parsed-graph cache")
+    parser.add_argument('--mmap', action='store_true', help="memory-map the cached CSR arrays instead of loading them")
+    parser.add_argument('--out', default=None, help="solution file instead of stdout")
+    parser.add_argument('--validate', action='store_true', help="check the DS against the .gr file afterwards")
+    args = parser.parse_args()
+    if args.mmap and args.cache is None:
+        parser.error("--mmap needs --cache")
+
+    random.seed(args.seed)
+    ds = solve(args.algo, read_gr(args.graph, args.cache, args.mmap), args.time_limit)
+    write_solution(ds, args.out or sys.stdout)
+    if args.validate:
+        problems = validate(args.graph, ds)
+        for problem in problems:
+            print(problem, file=sys.stderr)
+        if problems:
+            raise SystemExit(1)
@@ -0,0 +1,147 @@
+from time import time
+from graph_io import CSRGraph, to_csr, adjacency_lists
+
+# the one table of algorithms, used by solve.py, get_bounds.py and benchmark.py.
+# name -> (solver, graph kind, result). a solver gets the graph and a time limit in seconds (which
+# the approximations and the untimed schedules ignore) and returns a DS, or a number for the lower
+# bounds. solver modules are imported inside the solver, so looking one up costs nothing and
+# running one pays only for the backends it really uses
+SOLVERS = {}
+# names older result files use
+ALIASES = {'LP_lower_bound': 'lp_bound', 'LnAnnealing': 'anneal_ln', 'LpRoundAnnealing': 'anneal_lp'}
+
+
+def register(name, graph='csr', result='ds'):
+    # graph: 'csr' for solvers that work on a CSRGraph, 'nx' for those that need networkx
+    # result: 'ds' or 'bound'
+    def wrap(solver):
+        SOLVERS[name] = (solver, graph, result)
+        return solver
+    return wrap
+
+
+def ds_solvers():
+    return sorted(name for name, (_, _, result) in SOLVERS.items() if result == 'ds')
+
+
+def solve(name, g, time_limit=None):
+    solver, kind, _ = SOLVERS[ALIASES.get(name, name)]
+    if kind == 'csr':
+        g = to_csr(g)
+    elif isinstance(g, CSRGraph):
+        g = g.to_networkx()
+    return solver(g, time_limit)
+
+
+@register('approx_2')
+def approx_2(g, time_limit):
+    from approxes import approx_2_ds
+    return approx_2_ds(g)
+
+
+@register('approx_ln')
+def approx_ln(g, time_limit):
+    from approxes import approx_ln_ds
+    return approx_ln_ds(g)
+
+
+@register('approx_greedy')
+def approx_greedy(g, time_limit):
+    from approxes import approx_greedy_ds
+    from domination import prune_redundant
+    return prune_redundant(adjacency_lists(g), approx_greedy_ds(g))
+
+
+@register('lp_bound', result='bound')
+def lp_bound(g, time_limit):
+    from math import ceil
+    from lower_bound_lp import LpGraphSolver
+    return ceil(LpGraphSolver(g, time_limit=time_limit).SolveLP() - 1e-6)
+
+
+@register('lp_rounding')
+def lp_rounding(g, time_limit):
+    from lower_bound_lp import LpGraphSolver
+    from solution import Solution
+    g_lp = LpGraphSolver(g)
+    g_lp.SolveLP()
+    g_lp.LpRoundingDS()
+    return Solution.from_indicator(g_lp.roundingds)
+
+
+@register('lp_rounding_v2')
+def lp_rounding_v2(g, time_limit):
+    from lower_bound_lp import LpGraphSolver
+    from solution import Solution
+    g_lp = LpGraphSolver(g)
+    g_lp.SolveLP()
+    g_lp.LpRoundingDS_ver2()
+    return Solution.from_indicator(g_lp.roundingds2)
+
+
+@register('lp_rounding_best')
+def lp_rounding_best(g, time_limit):
+    from lower_bound_lp import LpGraphSolver
+    from solution import Solution
+    g_lp = LpGraphSolver(g)
+    g_lp.SolveLP()
+    g_lp.LpRoundingDS_ver2()
+    g_lp.LpRoundingBest()
+    return Solution.from_indicator(g_lp.roundingbest)
+
+
+def annealing(approx_type, schedule, batch=None, timed=True):
+    def run(g, time_limit):
+        from local_search import DSAnnealing
+        start = time()
+        g_anneal = DSAnnealing(g, approx_type)
+        # the starting DS (an LP solve for 'lp') comes out of the same budget
+        time_limit = None if time_limit is None or not timed else max(time_limit - (time() - start), 0)
+        g_anneal.annealing(schedule, time_limit=time_limit, batch=batch)
+        return g_anneal.ds
+    return run
+
+
+register('anneal_ln')(annealing('ln', 'exp'))
+register('anneal_lp')(annealing('lp', 'poly'))
+register('anneal_batch')(annealing('ln', 'exp', batch=256))
+# the full schedules from an 'ln' start, untimed so that benchmarks measure the schedule itself
+for schedule in ('exp', 'poly', 'adaptive', 'step'):
+    register(f'anneal_{schedule}')(annealing('ln', schedule, timed=False))
+register('anneal_exp_batch')(annealing('ln', 'exp', batch=256, timed=False))
+
+
+@register('local_search')
+def local_search(g, time_limit):
+    from local_search import DSLocalSearch
+    start = time()
+    g_search = DSLocalSearch(g, 'ln')
+    g_search.search(10 if time_limit is None else max(time_limit - (time() - start), 0))
+    return g_search.ds
+
+
+@register('portfolio')
+def portfolio(g, time_limit):
+    from portfolio import portfolio_annealing
+    return portfolio_annealing(g, 40 if time_limit is None else time_limit)
+
+
+@register('genetic')
+def genetic(g, time_limit):
+    from genetic import DSGenetic
+    g_genetic = DSGenetic(g, time_limit=time_limit)
+    g_genetic.work()
+    return g_genetic.best_ds
+
+
+@register('branch_bound', graph='nx')
+def branch_bound(g, time_limit):
+    from branch_bound import branch_and_bound
+    return branch_and_bound(g, time_limit).best_ds
+
+
+@register('exact')
+def exact(g, time_limit):
+    # per connected component: closed forms, tree decomposition DP, ILP
+    from components import solve_by_components
+    return solve_by_components(g)
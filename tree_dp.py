@@ -0,0 +1,159 @@
+from time import time
+import networkx as nx
+from networkx.algorithms.approximation import treewidth_min_degree
+from graph_io import load_graph, CACHE_DIR
+from kernel import exact_min_dominating_set
+
+# a state of a bag is a pair of bitmasks over the positions of its vertices: (in the DS, dominated);
+# vertices in neither are not dominated yet
+
+
+def degeneracy(g):
+    return max(nx.core_number(g).values(), default=0)
+
+
+def put(table, s, c, ptr):
+    old = table.get(s)
+    if old is None or c < old[0]:
+        table[s] = (c, ptr)
+
+
+def introduce(table, order, v, g):
+    # table: state -> (cost, backpointer); returns the table over order + [v]
+    nbrs = 0
+    for i, u in enumerate(order):
+        if g.has_edge(u, v):
+            nbrs |= 1 << i
+    bit = 1 << len(order)
+    new = {}
+    for (bm, dm), (c, ptr) in table.items():
+        put(new, (bm, dm), c, ptr)
+        if bm & nbrs:
+            put(new, (bm, dm | bit), c, ptr)
+        put(new, (bm | bit, dm | (nbrs & ~bm)), c + 1, ('v', v, ptr))
+    order.append(v)
+    return new
+
+
+def drop_bit(x, p):
+    return ((x >> (p + 1)) << p) | (x & ((1 << p) - 1))
+
+
+def forget(table, order, v):
+    p = order.index(v)
+    bit = 1 << p
+    new = {}
+    for (bm, dm), (c, ptr) in table.items():
+        if (bm | dm) & bit:  # otherwise nothing left in the graph could dominate v
+            put(new, (drop_bit(bm, p), drop_bit(dm, p)), c, ptr)
+    del order[p]
+    return new
+
+
+def reorder(table, order, target):
+    perm = [order.index(v) for v in target]
+    if perm == list(range(len(perm))):
+        return table
+
+    def move(x):
+        y = 0
+        for i, p in enumerate(perm):
+            if x >> p & 1:
+                y |= 1 << i
+        return y
+
+    return {(move(bm), move(dm)): entry for (bm, dm), entry in table.items()}
+
+
+def join(t1, t2):
+    # both tables over the same order; the DS vertices must agree, every other vertex is dominated
+    # if it is on either side, and the DS vertices of the bag are counted on both sides
+    groups = {}
+    for (bm, dm), entry in t2.items():
+        groups.setdefault(bm, []).append((dm, entry))
+    new = {}
+    for (bm, dm1), (c1, p1) in t1.items():
+        in_ds = bin(bm).count('1')
+        for dm2, (c2, p2) in groups.get(bm, ()):
+            put(new, (bm, dm1 | dm2), c1 + c2 - in_ds, ('j', p1, p2))
+    return new
+
+
+def collect(ptr):
+    ds = set()
+    stack = [ptr]
+    while stack:
+        ptr = stack.pop()
+        if ptr is None:
+            continue
+        if ptr[0] == 'v':
+            ds.add(ptr[1])
+            stack.append(ptr[2])
+        else:
+            stack.append(ptr[1])
+            stack.append(ptr[2])
+    return ds
+
+
+def tree_decomposition_ds(g, max_width=7):
+    # exact minimum DS by dynamic programming over a min-degree tree decomposition, or None when
+    # the decomposition is wider than max_width (tables have up to 3^(width+1) states and a join
+    # costs up to 5^(width+1)). the degeneracy is a lower bound on the treewidth, so graphs that
+    # are too dense are rejected before the decomposition is even built
+    if g.number_of_nodes() == 0:
+        return set()
+    if degeneracy(g) > max_width:
+        return None
+    width, tree = treewidth_min_degree(g)
+    if width > max_width:
+        return None
+
+    root = next(iter(tree.nodes))
+    parent = nx.dfs_predecessors(tree, root)
+    children = {}
+    for bag, p in parent.items():
+        children.setdefault(p, []).append(bag)
+
+    tables = {}
+    for bag in nx.dfs_postorder_nodes(tree, root):
+        bag_order = sorted(bag)
+        table = None
+        for child in children.get(bag, []):
+            child_table, child_order = tables.pop(child)
+            for v in list(child_order):
+                if v not in bag:
+                    child_table = forget(child_table, child_order, v)
+            for v in bag_order:
+                if v not in child_order:
+                    child_table = introduce(child_table, child_order, v, g)
+            child_table = reorder(child_table, child_order, bag_order)
+            table = child_table if table is None else join(table, child_table)
+        if table is None:
+            table, order = {(0, 0): (0, None)}, []
+            for v in bag_order:
+                table = introduce(table, order, v, g)
+        tables[bag] = (table, bag_order)
+
+    table, order = tables[root]
+    for v in list(order):
+        table = forget(table, order, v)
+    return collect(table[(0, 0)][1])
+
+
+def exact_ds(g, max_width=7):
+    ds = tree_decomposition_ds(g, max_width)
+    if ds is None:
+        return exact_min_dominating_set(g)
+    return ds
+
+
+if __name__ == "__main__":
+    for j in range(1, 10):
+        g = load_graph(f"./exact_graphs/exact_00{j}.gr", CACHE_DIR)
+
+        start = time()
+        ds = tree_decomposition_ds(g)
+        if ds is None:
+            print(f"Graph {j}: too wide, degeneracy {degeneracy(g)}")
+        else:
+            print(f"Graph {j}: DS {len(ds)} Time: {time() - start}")